@@ -0,0 +1,155 @@
+### ACQUISITION PIPELINE ########################
+# Usage: from commands.acquisition_pipeline import *
+# Notes: overlaps FIFO draining with result formatting and disk output
+#################################################
+
+import os
+import shutil
+import datetime
+import queue
+import threading
+from commands.helper_functions import set_ext_clock, set_sample_select, get_channels_in_use
+from commands.sampling_functions import iter_trials, iter_adaptive_trials
+
+_DONE = object()
+
+def run_pipelined(consume, trials_num, queue_size=2, **sampling_kwargs):
+    """
+    Runs iter_trials() on a drain thread and hands every (trial, counts, timestamps)
+    to consume() through a queue of queue_size. Returns the per-trial counts.
+    """
+    results = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    drain_error = []
+
+    def drain():
+        try:
+            for item in iter_trials(trials_num, **sampling_kwargs):
+                results.put(item)
+                if stop.is_set():
+                    break
+        except BaseException as e:
+            drain_error.append(e)
+        finally:
+            results.put(_DONE)
+
+    drain_thread = threading.Thread(target=drain, name='fifo-drain', daemon=True)
+    drain_thread.start()
+
+    all_counts = []
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            all_counts.append(item[1])
+            consume(*item)
+    except BaseException:
+        # Stop arming new trials and unblock the drain thread before re-raising
+        stop.set()
+        while drain_thread.is_alive():
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        raise
+    drain_thread.join()
+
+    if drain_error:
+        raise drain_error[0]
+    return all_counts
+
+class SamplingTextWriter:
+    """
+    Pipeline consumer producing the run_sampling.py text layout. Each trial's
+    timestamp lines go straight to a per-channel spool file
+    ({spool_prefix}.ch{c}.part); append_to() joins them channel by channel.
+    """
+    def __init__(self, channels, spool_prefix):
+        self.channels = [c for c in range(16) if c in channels]
+        self.counts = {c: [] for c in self.channels}
+        self.spool_names = {c: f'{spool_prefix}.ch{c}.part' for c in self.channels}
+        self.spools = {c: open(name, 'w') for c, name in self.spool_names.items()}
+
+    def __call__(self, trial, counts, timestamps):
+        for c in self.channels:
+            self.counts[c].append(counts[c])
+            spool = self.spools[c]
+            spool.write(f'Trial {trial} timestamps: {timestamps[c].tolist()}\n')
+            spool.flush()
+
+    def write(self, f):
+        print('\nRESULTS:')
+        for c in self.channels:
+            counts = self.counts[c]
+            f.write(f'Channel {c} results\n')
+            print(f'Channel {c} results')
+            f.write(f'Counts: {counts}\n')
+            print(f'Counts: {counts}')
+            print(f'Avg Count: {sum(counts) / len(counts)}')
+            f.write(f'Avg Count: {sum(counts) / len(counts)}\n')
+            self.spools[c].close()
+            with open(self.spool_names[c]) as spool:
+                shutil.copyfileobj(spool, f)
+            f.write('\n')
+            print()
+
+    def append_to(self, filename, win_width):
+        """Appends one run_sampling.py block (header, results, separator) to filename."""
+        with open(filename, 'a') as f:
+            f.write(f'Sampling results below finished at: {datetime.datetime.now()}\n')
+            f.write(f'Window Width : {win_width}\n')
+            self.write(f)
+            f.write('******************************************************\n')
+        self.close()
+
+    def close(self):
+        """Closes and removes the spool files."""
+        for c, spool in self.spools.items():
+            spool.close()
+            if os.path.exists(self.spool_names[c]):
+                os.remove(self.spool_names[c])
+
+class CountSampler:
+    """
+    In-process measurement for the DAC sweeps: each call samples the channels in use
+    and returns {channel - channel_offset: average count}, optionally adaptively.
+    """
+    def __init__(self, trials_num=1, output_file=None, channel_offset=8,
+                 win_width=100e-6, win_wait=5e-6, reset_width=5e-6,
+                 rst_cal_gap=100e-9, external_clock=True, parallel_drain=False,
+                 precision=None, rel_precision=None, max_trials=10):
+        self.trials_num = trials_num
+        self.precision = precision
+        self.rel_precision = rel_precision
+        self.max_trials = max_trials
+        self.trials_taken = [] # trials used per call
+        self.output_file = output_file
+        self.channel_offset = channel_offset
+        self.win_width = win_width
+        self.sampling_kwargs = dict(win_width=win_width, win_wait=win_wait, reset_width=reset_width,
+                                    rst_cal_gap=rst_cal_gap, external_clock=external_clock,
+                                    parallel_drain=parallel_drain, sampling=True)
+        self.channels = [c for c in get_channels_in_use() if c >= channel_offset]
+        set_ext_clock(1 if external_clock else 0)
+        set_sample_select(1) #ignores delta t
+
+    def __call__(self):
+        writer = SamplingTextWriter(self.channels, self.output_file) if self.output_file else None
+        if self.precision is None and self.rel_precision is None:
+            trials = iter_trials(self.trials_num, **self.sampling_kwargs)
+        else:
+            trials = iter_adaptive_trials(self.max_trials, self.precision or 0.0, self.rel_precision or 0.0,
+                                          channels=self.channels, **self.sampling_kwargs)
+        totals = [0] * 16
+        n = 0
+        for trial in trials:
+            n += 1
+            for c in self.channels:
+                totals[c] += trial[1][c]
+            if writer: writer(*trial)
+        self.trials_taken.append(n)
+        if writer:
+            open(self.output_file, 'w').close()
+            writer.append_to(self.output_file, self.win_width)
+        return {c - self.channel_offset: totals[c] / max(n, 1) for c in self.channels}
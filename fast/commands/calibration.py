@@ -0,0 +1,339 @@
+### CALIBRATION ENGINE ##########################
+# Usage: from commands.calibration import *
+#        run_calibration(CalibrationPlan(...), [CalibTextSink(...), ConsoleSink()])
+# Notes: the one DAC-sweep calibration loop behind all run_calibration*
+#        scripts; they only differ in the plan they build
+#################################################
+
+import os
+import sys
+import json
+import inspect
+import datetime
+from commands.helper_functions import *
+from commands.sampling_functions import iter_trials, iter_adaptive_trials
+from commands.config_word import ConfigWord, dac_command_table
+from commands.serial_interface import send_serial_commands
+from commands.timestamp_file import TimestampFileWriter
+from commands.trial_timing import TrialProfiler
+
+class CalibrationPlan:
+    """
+    Everything that defines a calibration run: DAC settings, trials, interfaces,
+    recorded channels, bit order, config file, serial timing and iter_trials() settings.
+    """
+    def __init__(self, dac_settings=range(12, 32, 1), trials_num=1, interfaces=(1,),
+                 channels=range(7), bit_order='mmap_args', config_file='configs/calibration.cfg',
+                 win_width=100e-6, win_wait=5e-6, reset_width=5e-6, rst_cal_gap=100e-9,
+                 external_clock=True, sample_select=1, delta_t=0, sampling=True,
+                 cal_pulse=False, parallel_drain=False, serial_timing=None,
+                 precision=None, rel_precision=None, max_trials=10):
+        self.dac_settings = list(dac_settings)
+        self.trials_num = trials_num
+        self.interfaces = tuple(interfaces)
+        self.channels = list(channels)
+        self.bit_order = bit_order
+        self.config_file = config_file
+        self.win_width = win_width
+        self.win_wait = win_wait
+        self.reset_width = reset_width
+        self.rst_cal_gap = rst_cal_gap
+        self.external_clock = external_clock
+        self.sample_select = sample_select
+        self.delta_t = delta_t
+        self.sampling = sampling
+        self.cal_pulse = cal_pulse
+        self.parallel_drain = parallel_drain
+        self.serial_timing = serial_timing
+        self.precision = precision
+        self.rel_precision = rel_precision
+        self.max_trials = max_trials
+
+    @classmethod
+    def from_args(cls, args, **overrides):
+        """Plan from an argparse namespace: every attribute named like a plan field is used."""
+        fields = inspect.signature(cls).parameters
+        values = {k: v for k, v in vars(args).items() if k in fields}
+        values.update(overrides)
+        return cls(**values)
+
+    @property
+    def adaptive(self):
+        return self.precision is not None or self.rel_precision is not None
+
+    def dac_commands(self):
+        """{DAC setting: 32-bit serial word} for the whole sweep."""
+        return dac_command_table(ConfigWord.from_file(self.config_file), self.dac_settings, self.bit_order)
+
+    def trials(self, file_writer=None, profiler=None):
+        """Trial iterator for one DAC setting."""
+        kwargs = dict(win_width=self.win_width, win_wait=self.win_wait,
+                      reset_width=self.reset_width, rst_cal_gap=self.rst_cal_gap,
+                      external_clock=self.external_clock, sampling=self.sampling,
+                      cal_pulse=self.cal_pulse, file_writer=file_writer,
+                      parallel_drain=self.parallel_drain, profiler=profiler)
+        if self.adaptive:
+            # only the recorded channels have to converge
+            working = get_channels_in_use()
+            return iter_adaptive_trials(self.max_trials, self.precision or 0.0, self.rel_precision or 0.0,
+                                        channels=[c for c in self.channels if c in working], **kwargs)
+        return iter_trials(self.trials_num, **kwargs)
+
+    def describe(self):
+        """JSON-friendly summary, e.g. for binary file metadata."""
+        plan = dict(vars(self))
+        plan['serial_timing'] = vars(self.serial_timing) if self.serial_timing else None
+        return plan
+
+# --- SINKS --------------------------------------
+# run_calibration() calls, on every sink:
+#   start(plan)                           before the first DAC setting
+#   trial(dac_setting, trial, counts, timestamps)  after every drained trial;
+#                                         may return a JSON-friendly reference
+#                                         to where it stored the trial, which
+#                                         the run journal keeps
+#   point(dac_setting, all_counts)        after each setting, [trial][channel];
+#                                         also for settings replayed from the
+#                                         journal on resume
+#   close()                               at the end, also after an error
+
+class CalibrationSink:
+    """Base class with no-op hooks; sinks override the ones they need."""
+    def start(self, plan):
+        pass
+
+    def trial(self, dac_setting, trial, counts, timestamps):
+        pass
+
+    def point(self, dac_setting, all_counts):
+        pass
+
+    def close(self):
+        pass
+
+class CalibTextSink(CalibrationSink):
+    """The outputs/ch{c}_calib.txt files ('DAC setting / Counts / Mean'), rewritten for every run."""
+    def __init__(self, directory='outputs'):
+        self.directory = directory
+        self.files = {}
+
+    def start(self, plan):
+        for c in plan.channels:
+            fname = os.path.join(self.directory, f'ch{c}_calib.txt')
+            if os.path.exists(fname):
+                os.remove(fname)
+            self.files[c] = open(fname, 'a')
+
+    def point(self, dac_setting, all_counts):
+        for c, f in self.files.items():
+            counts = [trial[c] for trial in all_counts]
+            mean_val = sum(counts)/len(counts) if counts else 0
+            f.write(f'DAC setting: {dac_setting}\nCounts: {counts}\nMean: {mean_val:.2f}\n')
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+class ConsoleSink(CalibrationSink):
+    """Prints each setting's counts for the recorded channels that are in use."""
+    def start(self, plan):
+        working_channels = get_channels_in_use()
+        self.channels = [c for c in plan.channels if c in working_channels]
+
+    def point(self, dac_setting, all_counts):
+        for c in self.channels:
+            counts = [trial[c] for trial in all_counts]
+            mean_val = sum(counts)/len(counts) if counts else 0
+            print(f'Channel {c} counts: {counts}, Mean: {mean_val:.2f}')
+
+class BinarySink(CalibrationSink):
+    """
+    Every trial's timestamps in a binary timestamp file, flushed per trial.
+    With keep_existing, writes to the first free name.1, name.2, ... instead.
+    """
+    def __init__(self, filename, codec='raw', metadata=None, keep_existing=False):
+        self.filename = filename
+        self.codec = codec
+        self.metadata = metadata or {}
+        self.keep_existing = keep_existing
+        self.writer = None
+
+    def start(self, plan):
+        if self.keep_existing:
+            base, part = self.filename, 0
+            while os.path.exists(self.filename):
+                part += 1
+                self.filename = f'{base}.{part}'
+        metadata = plan.describe()
+        metadata['calib_channels'] = metadata.pop('channels')
+        metadata.update(date=str(datetime.datetime.now()), channels=get_channels_in_use())
+        metadata.update(self.metadata)
+        self.writer = TimestampFileWriter(self.filename, metadata, codec=self.codec)
+
+    def trial(self, dac_setting, trial, counts, timestamps):
+        index, offset = self.writer.add_trial(timestamps)
+        self.writer.flush() # the journal entry must not point past the file
+        return {'file': self.filename, 'trial': index, 'offset': offset}
+
+    def close(self):
+        if self.writer: self.writer.close()
+
+# -----------------------------------------------
+
+class CalibrationJournal:
+    """
+    Append-only JSON-lines record of a run (plan, trial, point and end records).
+    With resume, completed settings are loaded into done.
+    """
+    PLAN_FIELDS = ('trials_num', 'bit_order', 'config_file', 'interfaces', 'win_width',
+                   'win_wait', 'reset_width', 'rst_cal_gap', 'external_clock',
+                   'sample_select', 'delta_t', 'sampling', 'cal_pulse',
+                   'precision', 'rel_precision', 'max_trials')
+
+    def __init__(self, filename, plan, resume=False, new_run=False):
+        self.filename = filename
+        self.done = {}
+        if resume and os.path.exists(filename):
+            self._load(plan)
+            self._f = open(filename, 'a')
+        else:
+            if os.path.exists(filename) and not new_run and not self._finished():
+                print(f"Error: {filename} holds an unfinished run. Continue it with --resume, "
+                      f"or pass --new_run to overwrite it.")
+                sys.exit(1)
+            self._f = open(filename, 'w')
+            self._write({'type': 'plan', 'plan': plan.describe(), 'started': str(datetime.datetime.now())})
+            self._sync()
+
+    def _load(self, plan):
+        trials, valid_end = {}, 0
+        with open(self.filename, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                valid_end += len(line)
+                if record['type'] == 'plan':
+                    self._check_plan(record['plan'], plan.describe())
+                elif record['type'] == 'trial':
+                    trials.setdefault(record['dac_setting'], []).append(record['counts'])
+                elif record['type'] == 'point':
+                    self.done[record['dac_setting']] = trials.pop(record['dac_setting'], [])
+        if valid_end < os.path.getsize(self.filename):
+            with open(self.filename, 'r+b') as f:
+                f.truncate(valid_end)
+
+    def _finished(self):
+        """True if the journal's last complete line is the end record."""
+        last = None
+        with open(self.filename, 'rb') as f:
+            for line in f:
+                if line.endswith(b'\n'):
+                    last = line
+        try:
+            return last is not None and json.loads(last).get('type') == 'end'
+        except ValueError:
+            return False
+
+    def _check_plan(self, old, new):
+        changed = [k for k in self.PLAN_FIELDS if json.loads(json.dumps(new.get(k))) != old.get(k)]
+        if changed:
+            print(f"Error: {self.filename} was written with different {', '.join(changed)}; "
+                  f"start a new journal instead of resuming.")
+            sys.exit(1)
+
+    def _write(self, record):
+        self._f.write(json.dumps(record) + '\n')
+
+    def _sync(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def trial(self, dac_setting, trial, counts, blobs):
+        self._write({'type': 'trial', 'dac_setting': dac_setting, 'trial': trial,
+                     'counts': list(counts), 'blobs': blobs})
+        self._f.flush()
+
+    def point(self, dac_setting):
+        self._write({'type': 'point', 'dac_setting': dac_setting})
+        self._sync()
+
+    def end(self):
+        self._write({'type': 'end'})
+        self._sync()
+
+    def close(self):
+        self._f.close()
+
+def run_calibration(plan, sinks=(), delta_log='deltaT_log.txt', profile=None,
+                    journal=None, resume=False, new_run=False):
+    """
+    Sweeps plan.dac_settings, sampling each setting and handing the trials to sinks.
+    Returns {DAC setting: [trial][channel] counts}.
+    """
+    dac_commands = plan.dac_commands()
+    profiler = TrialProfiler() if profile else None
+    journal = CalibrationJournal(journal, plan, resume, new_run) if journal else None
+    if journal and journal.done:
+        print(f"Resuming: {len(journal.done)} DAC setting(s) already in {journal.filename}")
+    results = {}
+    for sink in sinks:
+        sink.start(plan)
+    try:
+        set_ext_clock(1 if plan.external_clock else 0)
+        set_sample_select(plan.sample_select)
+        set_delta_t(plan.delta_t)
+
+        names = ' and '.join(map(str, plan.interfaces))
+        print(f"Running Calibration on interface{'s' if len(plan.interfaces) > 1 else ''} {names}...")
+
+        with open(delta_log, 'a') as log:
+            for i, dac_setting in enumerate(plan.dac_settings, 1):
+                print(f'*** DAC setting: {dac_setting}, ({i} out of {len(plan.dac_settings)}) ***')
+
+                if journal and dac_setting in journal.done:
+                    print('Already in the run journal, not sampled again.')
+                    results[dac_setting] = journal.done[dac_setting]
+                    for sink in sinks:
+                        sink.point(dac_setting, results[dac_setting])
+                    print("#"*10 + "\n")
+                    continue
+
+                # with both interfaces the two words are shifted in the same sequence
+                cmd_int = dac_commands[dac_setting]
+                send_serial_commands({interface: cmd_int for interface in plan.interfaces}, plan.serial_timing)
+
+                log.write(f"\n-- DAC setting: {dac_setting} ---\n")
+
+                # Only the counts are kept in memory; timestamps go to the sinks
+                all_counts = []
+                for trial in plan.trials(log, profiler):
+                    all_counts.append(trial[1])
+                    blobs = [sink.trial(dac_setting, *trial) for sink in sinks]
+                    if journal:
+                        journal.trial(dac_setting, trial[0], trial[1], [b for b in blobs if b is not None])
+                if profiler:
+                    for record in profiler.records[len(profiler.records) - len(all_counts):]:
+                        log.write(profiler.format_record(record) + "\n")
+
+                results[dac_setting] = all_counts
+                for sink in sinks:
+                    sink.point(dac_setting, all_counts)
+                if journal:
+                    journal.point(dac_setting)
+                print("#"*10 + "\n")
+        if journal:
+            journal.end()
+    finally:
+        for sink in sinks:
+            sink.close()
+        if journal:
+            journal.close()
+        if profiler:
+            profiler.write_json(profile)
+            print(f"Trial timing written to {profile}")
+        print("Calibration complete. Files closed.")
+    return results
@@ -0,0 +1,105 @@
+### QPIX CONFIGURATION WORD #####################
+# Usage: from commands.config_word import *
+# Notes: field-level model of the 32-bit serial configuration word
+#################################################
+
+from commands.helper_functions import read_config_file
+
+# Fields in .cfg order; the first line of the file is the MSB (bit 31)
+FIELDS = (
+    'replCur1', 'replCur2', 'replCur3', 'replCur4',
+    'curReplen0', 'curReplen1', 'curReplen2',
+    'curCmp0', 'curCmp1', 'curCmp2',
+    'curAmp0', 'curAmp1', 'curAmp2',
+    'curInt0', 'curInt1', 'curInt2',
+    'enable0', 'enable1', 'enable2', 'enable3',
+    'enable4', 'enable5', 'enable6', 'enable7',
+    'replenCur0', 'CLK_source_RO', 'DBL_bar', 'ringOsc_f2',
+    'ringOsc_f3', 'en_ringOsc', 'LVDSdrvr_strn', 'en_calB',
+)
+SHIFTS = {name: 31 - i for i, name in enumerate(FIELDS)}
+MASKS = {name: 1 << shift for name, shift in SHIFTS.items()}
+
+# Which field receives each bit (index = DAC bit, LSB first) of the 5-bit
+# replenishment-current DAC setting. The calibration scripts disagree:
+#   'mmap_args': run_calibration_mmap_args.py/_zt.py - bits 0-3 -> replCur1-4,
+#                bit 4 -> replenCur0
+#   'legacy':    run_calibration.py, run_calibration_mmap.py and slow/ -
+#                bit 0 -> replenCur0, bits 1-4 -> replCur1-4
+DAC_BIT_ORDERS = {
+    'mmap_args': ('replCur1', 'replCur2', 'replCur3', 'replCur4', 'replenCur0'),
+    'legacy': ('replenCur0', 'replCur1', 'replCur2', 'replCur3', 'replCur4'),
+}
+DAC_FIELDS_MASK = MASKS['replCur1'] | MASKS['replCur2'] | MASKS['replCur3'] | MASKS['replCur4'] | MASKS['replenCur0']
+
+def _dac_table(order):
+    """DAC field bits of the word for each of the 32 DAC settings."""
+    fields = DAC_BIT_ORDERS[order]
+    table = []
+    for dac in range(32):
+        bits = 0
+        for k, name in enumerate(fields):
+            if dac >> k & 1:
+                bits |= MASKS[name]
+        table.append(bits)
+    return table
+
+_DAC_TABLES = {order: _dac_table(order) for order in DAC_BIT_ORDERS}
+
+class ConfigWord:
+    """
+    A QPix configuration word. Parsed once into an int; fields are read and
+    replaced through precomputed masks, so building a sweep point is a couple
+    of integer operations instead of string slicing.
+    """
+    def __init__(self, value=0):
+        self.value = value & 0xFFFFFFFF
+
+    @classmethod
+    def from_file(cls, filename):
+        """Reads a .cfg file (see configs/calibration.cfg)."""
+        return cls(int(read_config_file(filename), 2))
+
+    def __int__(self):
+        return self.value
+
+    def __eq__(self, other):
+        if not isinstance(other, (ConfigWord, int)):
+            return NotImplemented
+        return int(self) == int(other)
+
+    def __hash__(self):
+        return hash(self.value) # equal to the plain int it compares equal to
+
+    def __repr__(self):
+        return f'ConfigWord(0x{self.value:08X})'
+
+    def __getitem__(self, name):
+        return self.value >> SHIFTS[name] & 1
+
+    def replace(self, **fields):
+        """New word with the given fields set, e.g. replace(DBL_bar=1, en_calB=0)."""
+        value = self.value
+        for name, bit in fields.items():
+            value = (value & ~MASKS[name]) | (bool(bit) << SHIFTS[name])
+        return ConfigWord(value)
+
+    def fields(self):
+        return {name: self[name] for name in FIELDS}
+
+    def hex(self):
+        return f'0x{self.value:08X}'
+
+    def with_dac(self, dac, order='mmap_args'):
+        """This word with the 5-bit replenishment DAC set to dac."""
+        return ConfigWord(dac_command(self.value, dac, order))
+
+def dac_command(base, dac, order='mmap_args'):
+    """Integer command for one DAC setting on top of base (int or ConfigWord)."""
+    return (int(base) & ~DAC_FIELDS_MASK) | _DAC_TABLES[order][dac & 0x1F]
+
+def dac_command_table(base, dac_settings, order='mmap_args'):
+    """{DAC setting: integer command} for a whole sweep."""
+    base = int(base) & ~DAC_FIELDS_MASK
+    table = _DAC_TABLES[order]
+    return {dac: base | table[dac & 0x1F] for dac in dac_settings}
@@ -0,0 +1,139 @@
+### SIMULATED QPIX FPGA #########################
+# Usage: QPIX_BACKEND=sim python3 run_sampling.py
+#        or helper_functions.set_backend(SimulatedFPGA(...))
+# Notes: register-level stand-in for the /dev/mem mapping, so acquisition
+#        code can run and be profiled without the Zynq board
+#################################################
+
+import mmap
+import random
+import struct
+import time
+from collections import deque
+
+MAP_SIZE = 0x1000
+TICK = 20e-9 # timestamp counter period
+
+# Register offsets from 0x43c00000
+CTRL = 0x000
+SERIAL_CTRL = {1: 0x004, 2: 0x00c}
+SERIAL_DATA = {1: 0x008, 2: 0x010}
+READ_STROBE = 0x018
+WIN_WIDTH = 0x01c
+RESET_WIDTHS = 0x020
+WIN_WAIT = 0x024
+TIMESTAMP_BASE = 0x108
+FIFO_STATUS_BASE = 0x1b4
+
+# Control register bits
+CTRL_RESET = 1 << 0
+CTRL_CAL_PULSE = 1 << 4
+CTRL_SAMPLE_PULSE = 1 << 15
+
+class SimulatedFPGA:
+    """
+    Register file of the QPix readout firmware, with FIFOs filled by Poisson
+    resets and serial interfaces shifting at serial_clock_hz.
+    """
+    def __init__(self, rates=None, fifo_depth=2048, seed=None, serial_clock_hz=1e6):
+        self._regs = mmap.mmap(-1, MAP_SIZE)
+        self.rates = list(rates) if rates is not None else [100e3] * 16
+        self.fifo_depth = fifo_depth
+        self.fifos = [deque() for _ in range(16)]
+        self.shift_regs = {1: 0, 2: 0}
+        self.qpix_config = {1: None, 2: None}
+        self.serial_clock_hz = serial_clock_hz
+        self._shift_start = {1: None, 2: None}
+        self._rng = random.Random(seed)
+        self._t0 = time.perf_counter()
+        for c in range(16):
+            self._update_status(c)
+
+    def __len__(self):
+        return MAP_SIZE
+
+    def __getitem__(self, key):
+        return self._regs[key]
+
+    def __setitem__(self, key, value):
+        offset = key.start if isinstance(key, slice) else key
+        prev = self._word(offset)
+        self._regs[key] = value
+        new = self._word(offset)
+        if offset == CTRL:
+            self._control(prev, new)
+        elif offset == READ_STROBE:
+            self._strobe(new)
+        elif offset in SERIAL_CTRL.values():
+            interface = 1 if offset == SERIAL_CTRL[1] else 2
+            self._serial(interface, prev, new)
+
+    def _word(self, offset):
+        return struct.unpack_from('<I', self._regs, offset & ~0x3)[0]
+
+    def _put(self, offset, value):
+        struct.pack_into('<I', self._regs, offset, value & 0xFFFFFFFF)
+
+    def now_ticks(self):
+        """Free-running timestamp counter."""
+        return int((time.perf_counter() - self._t0) / TICK) + 400_000_000_000
+
+    # --- modelled behaviour -----------------------
+
+    def _control(self, prev, new):
+        rising = new & ~prev
+        if new & CTRL_RESET:
+            for c in range(16):
+                self.fifos[c].clear()
+                self._update_status(c)
+        if rising & (CTRL_CAL_PULSE | CTRL_SAMPLE_PULSE):
+            self._fill_window()
+
+    def _fill_window(self):
+        width = self._word(WIN_WIDTH)
+        start = self.now_ticks() + (self._word(WIN_WAIT) & 0x7FFFFFFF)
+        for c in range(16):
+            rate = self.rates[c] * TICK # expected resets per tick
+            fifo = self.fifos[c]
+            if rate > 0:
+                t = self._rng.expovariate(rate)
+                while t < width and len(fifo) < self.fifo_depth:
+                    fifo.append(start + int(t))
+                    t += self._rng.expovariate(rate)
+            self._update_status(c)
+
+    def _strobe(self, mask):
+        for c in range(16):
+            if mask & (1 << c) and self.fifos[c]:
+                ts = self.fifos[c].popleft()
+                self._put(TIMESTAMP_BASE + 8 * c, ts >> 32)
+                self._put(TIMESTAMP_BASE + 8 * c + 4, ts)
+                self._update_status(c)
+
+    def _update_status(self, c):
+        n = len(self.fifos[c])
+        status = ((n == 0) << 0 | (n <= 1) << 1 |
+                  (n >= self.fifo_depth) << 8 | (n >= self.fifo_depth - 1) << 9)
+        self._put(FIFO_STATUS_BASE + 4 * c, status)
+
+    def _serial(self, interface, prev, new):
+        rising = new & ~prev
+        now = time.perf_counter()
+        if rising & 0x2: # load data into the FPGA shift register
+            self.shift_regs[interface] = self._word(SERIAL_DATA[interface])
+        shifting = 0x4 | 0x100 # gated clock runs while either bit is set
+        if new & shifting and self._shift_start[interface] is None:
+            self._shift_start[interface] = now
+        elif prev & shifting and not new & shifting:
+            bits = int((now - self._shift_start[interface]) * self.serial_clock_hz)
+            self._shift_out(interface, min(bits, 32))
+            self._shift_start[interface] = None
+
+    def _shift_out(self, interface, bits):
+        """Clocks the top `bits` bits of the shift register into QPix, MSB first."""
+        word = self.shift_regs[interface]
+        if bits >= 32:
+            self.qpix_config[interface] = word
+        elif bits > 0:
+            old = self.qpix_config[interface] or 0
+            self.qpix_config[interface] = ((old << bits) | (word >> (32 - bits))) & 0xFFFFFFFF
@@ -8,19 +8,42 @@ import os
 import sys
 import mmap
 import csv
+import struct
 
 # --- FPGA MEMORY CONFIGURATION ---
 FPGA_BASE_ADDR = 0x43C00000
 MAP_SIZE = 0x1000 # 4KB
 
-# Initialize memory mapping
-try:
-    _f = open("/dev/mem", "r+b")
-    # Mapping the memory block globally
-    _mem = mmap.mmap(_f.fileno(), MAP_SIZE, offset=FPGA_BASE_ADDR)
-except PermissionError:
-    print("Error: Accessing /dev/mem requires sudo/root privileges.")
-    sys.exit(1)
+# Register backend: every peek/poke goes through _mem, which is either the
+# /dev/mem mapping of the FPGA or the simulated FPGA in commands/fpga_sim.py
+_mem = None
+
+def set_backend(mem):
+    """Routes all register access to mem (the /dev/mem mmap or a SimulatedFPGA)."""
+    global _mem
+    _mem = mem
+
+def get_backend():
+    return _mem
+
+def open_devmem():
+    """Maps the FPGA register block from /dev/mem."""
+    f = open("/dev/mem", "r+b")
+    return mmap.mmap(f.fileno(), MAP_SIZE, offset=FPGA_BASE_ADDR)
+
+# Initialize memory mapping (QPIX_BACKEND=sim runs without the board)
+if os.environ.get('QPIX_BACKEND') == 'sim':
+    from commands.fpga_sim import SimulatedFPGA
+    set_backend(SimulatedFPGA())
+else:
+    try:
+        set_backend(open_devmem())
+    except PermissionError:
+        print("Error: Accessing /dev/mem requires sudo/root privileges.")
+        sys.exit(1)
+    except OSError as e:
+        print(f"Error: Cannot map FPGA registers from /dev/mem ({e}). Set QPIX_BACKEND=sim to use the simulated FPGA.")
+        sys.exit(1)
 
 def poke(addr, value):
     """Internal helper to write 32-bit values to a physical address."""
@@ -140,6 +163,28 @@ def read_ch_status(c):
         (ch_status & 0x1)        # empty
     )
 
+# --- BULK FIFO STATUS -------------------------
+# The 16 FIFO status registers are contiguous (0x43c001b4 - 0x43c001f0), so one
+# 64-byte slice of the mmap returns every channel's status word at once.
+FIFO_STATUS_BASE = 0x43c001b4
+_FIFO_STATUS_BLOCK = struct.Struct('<16I')
+
+def read_status_block():
+    """Reads the raw FIFO status words of all 16 channels in a single access."""
+    offset = FIFO_STATUS_BASE - FPGA_BASE_ADDR
+    return _FIFO_STATUS_BLOCK.unpack(_mem[offset:offset+64])
+
+def non_empty_channels(channels=range(16)):
+    """Returns a bitmask (bit c set) of the given channels whose FIFO holds data."""
+    status = read_status_block()
+    mask = 0
+    for c in channels:
+        if not status[c] & 0x1:
+            mask |= (1 << c)
+    return mask
+
+# -----------------------------------------------
+
 def read_ch_fifo(c):
     _, ts_hi_reg, ts_lo_reg = get_channel_registers(c)
     poke(0x43c00018, (1 << c))
@@ -148,6 +193,25 @@ def read_ch_fifo(c):
     lo = peek(ts_lo_reg)
     return (hi << 32) + lo
 
+# --- PARALLEL FIFO POP -------------------------
+# The read strobe (0x43c00018) is a channel bitmask and the timestamp hi/lo
+# registers (0x43c00108 - 0x43c00184) are contiguous, so several channels can
+# be popped with one strobe and collected with one 128-byte read.
+TIMESTAMP_BASE = 0x43c00108
+_TIMESTAMP_BLOCK = struct.Struct('<32I')
+
+def read_fifos(mask):
+    """
+    Pops one word from every channel set in mask using a single strobe.
+    Returns a list of 16 timestamps; entries for channels outside mask hold
+    whatever was last latched and should be ignored.
+    """
+    poke(0x43c00018, mask)
+    poke(0x43c00018, 0x00000000)
+    offset = TIMESTAMP_BASE - FPGA_BASE_ADDR
+    words = _TIMESTAMP_BLOCK.unpack(_mem[offset:offset+128])
+    return [(words[2*c] << 32) + words[2*c+1] for c in range(16)]
+
 def read_config_file(filename):
     if not os.path.exists(filename):
         print(f'Error: Config file {filename} does not exist.')
@@ -0,0 +1,240 @@
+### I2C DACS ####################################
+# Usage: from commands.i2c_dacs import *
+# Notes: in-process I2C access for the 10-bit TP/VCOMP DACs (bus 0) and the
+#        DAC7578 (bus 1); replaces one i2cset process per register write
+#################################################
+#
+# Each bus keeps its /dev/i2c-N descriptor open and issues SMBus transfers
+# through the I2C_SMBUS ioctl, exactly what i2cset does internally:
+#
+#   i2cset -y 0 <addr> <cmd> <word> w       -> write_word_data(addr, cmd, word)
+#   i2cset -y 1 <addr> <cmd> <b0> <b1> i    -> write_i2c_block_data(addr, cmd, [b0, b1])
+#
+# QPIX_BACKEND=sim swaps every bus for a FakeI2CBus that records the writes.
+# This module only imports the standard library, so the scripts in commands/
+# can load it as `i2c_dacs` when run directly.
+
+import os
+import sys
+import math
+import ctypes
+import struct
+import threading
+
+# --- LINUX I2C-DEV INTERFACE ---
+I2C_SLAVE = 0x0703
+I2C_SMBUS = 0x0720
+I2C_SMBUS_WRITE = 0
+I2C_SMBUS_WORD_DATA = 3
+I2C_SMBUS_I2C_BLOCK_DATA = 8
+I2C_SMBUS_BLOCK_MAX = 32
+
+class _SMBusIoctlData(ctypes.Structure):
+    """struct i2c_smbus_ioctl_data from linux/i2c-dev.h"""
+    _fields_ = [('read_write', ctypes.c_uint8), ('command', ctypes.c_uint8),
+                ('size', ctypes.c_uint32), ('data', ctypes.c_void_p)]
+
+class I2CBus:
+    """Open /dev/i2c-N issuing SMBus transfers through one preallocated ioctl argument."""
+    def __init__(self, bus):
+        import fcntl
+        self._ioctl = fcntl.ioctl
+        self.bus = bus
+        self.fd = os.open(f'/dev/i2c-{bus}', os.O_RDWR)
+        self._addr = None
+        self._lock = threading.Lock()
+        self._data = ctypes.create_string_buffer(I2C_SMBUS_BLOCK_MAX + 2) # union i2c_smbus_data
+        self._args = _SMBusIoctlData(I2C_SMBUS_WRITE, 0, 0, ctypes.addressof(self._data))
+
+    def _set_address(self, addr):
+        if addr != self._addr:
+            self._ioctl(self.fd, I2C_SLAVE, addr)
+            self._addr = addr
+
+    def _transfer(self, addr, cmd, size):
+        self._set_address(addr)
+        self._args.command = cmd
+        self._args.size = size
+        self._ioctl(self.fd, I2C_SMBUS, self._args)
+
+    def write_word_data(self, addr, cmd, word):
+        """SMBus write word: cmd, then word low byte first."""
+        with self._lock:
+            struct.pack_into('=H', self._data, 0, word & 0xFFFF)
+            self._transfer(addr, cmd, I2C_SMBUS_WORD_DATA)
+
+    def write_i2c_block_data(self, addr, cmd, data):
+        """Plain I2C block write: cmd, then the data bytes in order."""
+        if len(data) > I2C_SMBUS_BLOCK_MAX:
+            raise ValueError(f'I2C block writes are limited to {I2C_SMBUS_BLOCK_MAX} bytes')
+        with self._lock:
+            self._data[0] = len(data)
+            self._data[1:1+len(data)] = bytes(data)
+            self._transfer(addr, cmd, I2C_SMBUS_I2C_BLOCK_DATA)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+class FakeDAC7578:
+    """
+    Input and output registers of a DAC7578, driven by its command byte.
+    With ldac_low (default), every input write also reaches the output.
+    """
+    def __init__(self, ldac_low=True):
+        self.ldac_low = ldac_low
+        self.inputs = [0] * 8
+        self.outputs = [0] * 8
+
+    def write(self, cmd, data):
+        if len(data) < 2:
+            return
+        access, n = cmd >> 4, cmd & 0x0F
+        channels = range(8) if n == 0x0F else [n] if n < 8 else []
+        code = (data[0] << 8 | data[1]) >> 4
+        if access in (0x0, 0x2, 0x3):
+            for c in channels:
+                self.inputs[c] = code
+        if access == 0x1 or access == 0x3:
+            for c in channels:
+                self.outputs[c] = self.inputs[c]
+        elif access == 0x2 or self.ldac_low:
+            self.outputs[:] = self.inputs
+
+class FakeI2CBus:
+    """
+    Stand-in bus for QPIX_BACKEND=sim: records every transfer in log and regs
+    and passes it to the device model at that address, if any.
+    """
+    def __init__(self, bus, devices=None):
+        self.bus = bus
+        self.log = []
+        self.regs = {}
+        self.devices = devices or {}
+
+    def _record(self, addr, cmd, data):
+        self.log.append((addr, cmd, data))
+        self.regs[(addr, cmd)] = data
+        if addr in self.devices:
+            self.devices[addr].write(cmd, data)
+
+    def write_word_data(self, addr, cmd, word):
+        self._record(addr, cmd, bytes((word & 0xFF, word >> 8 & 0xFF)))
+
+    def write_i2c_block_data(self, addr, cmd, data):
+        if len(data) > I2C_SMBUS_BLOCK_MAX:
+            raise ValueError(f'I2C block writes are limited to {I2C_SMBUS_BLOCK_MAX} bytes')
+        self._record(addr, cmd, bytes(data))
+
+    def close(self):
+        pass
+
+# Open buses by number, shared by everything in the process
+_buses = {}
+
+def set_i2c_bus(bus, device):
+    """Routes all transfers on bus number `bus` to device (I2CBus or FakeI2CBus)."""
+    _buses[bus] = device
+
+def get_i2c_bus(bus):
+    """The open bus `bus`, opened on first use."""
+    device = _buses.get(bus)
+    if device is None:
+        if os.environ.get('QPIX_BACKEND') == 'sim':
+            dacs = {0x48: FakeDAC7578(), 0x49: FakeDAC7578()} if bus == DAC7578_BUS else None
+            device = FakeI2CBus(bus, dacs)
+        else:
+            try:
+                device = I2CBus(bus)
+            except PermissionError:
+                print(f"Error: Accessing /dev/i2c-{bus} requires sudo/root privileges.")
+                sys.exit(1)
+            except OSError as e:
+                print(f"Error: Cannot open /dev/i2c-{bus} ({e}). Set QPIX_BACKEND=sim to use a fake bus.")
+                sys.exit(1)
+        _buses[bus] = device
+    return device
+
+# --- 10-BIT DACS (TP / VCOMP, bus 0) ---
+DAC10_BUS = 0
+DAC10_ADDRS = {'TP': 0x0d, 'VCOMP': 0x0c} # U74
+DAC10_CHANNELS = {1: 0x01, 2: 0x02} # U65
+DAC10_VMAX = 1.2
+
+def dac10_counts(voltage):
+    """10-bit code for voltage, clamped to 0 - 1.2 V."""
+    steps = DAC10_VMAX/1024
+    if voltage < 0:
+        print("Invalid voltage specified! Value should be 0 - 1.2V")
+        return 0
+    if voltage > DAC10_VMAX:
+        print("Invalid voltage specified! Value should be 0 - 1.2V")
+        return 0x3ff
+    if voltage > 1.194:
+        return 0x3ff
+    return math.floor(voltage/steps)
+
+def dac10_word(counts):
+    """SMBus word for a 10-bit code: control bits 0x2, code << 2, byte-swapped for the Xilinx I2C."""
+    word = 0x2000 | (counts & 0x3ff) << 2
+    return (word >> 8) | (word & 0xFF) << 8
+
+def set_dac10(dac, channel, voltage):
+    """Sets 'TP' or 'VCOMP' output 1 or 2 to voltage. Returns the word written."""
+    word = dac10_word(dac10_counts(voltage))
+    get_i2c_bus(DAC10_BUS).write_word_data(DAC10_ADDRS[dac], DAC10_CHANNELS[int(channel)], word)
+    return word
+
+# --- DAC7578 (VSET, bus 1) ---
+# Command byte: access command in the high nibble, channel in the low nibble
+# (0xF addresses all eight channels at once)
+DAC7578_BUS = 1
+DAC7578_ADDR = 0x48
+DAC7578_CHANNELS = 8
+DAC7578_ALL = 0x0F
+DAC7578_WRITE = 0x00            # write input register n
+DAC7578_UPDATE = 0x10           # copy input register n to the output
+DAC7578_WRITE_UPDATE_ALL = 0x20 # write input register n, then update every output
+DAC7578_WRITE_UPDATE = 0x30     # write and update channel n
+
+def dac7578_counts(vset, vref):
+    """12-bit code for vset against vref, clamped to the DAC range."""
+    if vset <= 0:
+        return 0x000
+    if vset >= vref:
+        return 0xfff
+    return math.floor(vset/(vref/4096))
+
+def _dac7578_write(addr, cmd, counts):
+    value = (counts & 0xfff) << 4 # code left-aligned in 16 bits
+    get_i2c_bus(DAC7578_BUS).write_i2c_block_data(addr, cmd, (value >> 8, value & 0xFF))
+
+def set_dac7578(channel, counts, addr=DAC7578_ADDR):
+    """Writes one DAC7578 channel with command 0x0n, as the i2cset scripts did."""
+    _dac7578_write(addr, DAC7578_WRITE | channel, counts)
+
+def set_dac7578_all(counts, addr=DAC7578_ADDR):
+    """Writes and updates all 8 channels with one broadcast transaction."""
+    _dac7578_write(addr, DAC7578_WRITE_UPDATE | DAC7578_ALL, counts)
+
+def set_dac7578_channels(counts, channels=range(DAC7578_CHANNELS), addr=DAC7578_ADDR):
+    """
+    Sets channels to counts (one code, or {channel: code}) in as few transactions
+    as possible: one broadcast, or staged loads with a final update-all write.
+    """
+    channels = list(channels)
+    if not channels:
+        return
+    if not isinstance(counts, dict):
+        if len(set(channels)) == DAC7578_CHANNELS:
+            set_dac7578_all(counts, addr)
+            return
+        counts = dict.fromkeys(channels, counts)
+    for channel in channels[:-1]:
+        _dac7578_write(addr, DAC7578_WRITE | channel, counts[channel])
+    _dac7578_write(addr, DAC7578_WRITE_UPDATE_ALL | channels[-1], counts[channels[-1]])
+
+def update_dac7578(addr=DAC7578_ADDR):
+    """Copies every loaded input register to its output."""
+    get_i2c_bus(DAC7578_BUS).write_i2c_block_data(addr, DAC7578_UPDATE | DAC7578_ALL, (0, 0))
@@ -0,0 +1,275 @@
+### RESULTS INDEX ###############################
+# Usage: from commands.results_index import *
+# Notes: SQLite catalog of the outputs* run directories (run settings plus
+#        per-channel, per-DAC-setting statistics); see index_outputs.py
+#################################################
+#
+# Tables:
+#
+#   runs              one row per output directory: sample_select, delta_t,
+#                     cal_pulse, win_width, trials_num, date, free-text label
+#   files             every indexed text file with its size and mtime, so a
+#                     rescan only re-reads files that changed
+#   calib_points      one row per 'DAC setting' block of a chN_calib*.txt file
+#   sampling_results  one row per 'Channel N results' block of a sampling
+#                     file (run_sampling.py layout)
+#
+# Count statistics are n, mean, sample std, min and max; the raw counts are
+# kept as a JSON list. Run settings come from, in increasing priority:
+#   - the sampling file headers (date, window width)
+#   - the directory name, e.g. outputs_1_sampTrue_calFalse (delta_t,
+#     sample_select, cal_pulse) or outputs_feb13_run1 (date, label)
+#   - the plan record of a calib_journal.jsonl in the directory
+# Dates without a year are stored as '--MM-DD' (ISO 8601 truncated form), so
+# substr(date, -5, 2) is the month for every run.
+#
+# outputs/ is rewritten by every calibration; its rows are replaced on the
+# next scan, so rename the directory to keep a run in the catalog.
+
+import os
+import re
+import json
+import glob
+import sqlite3
+import datetime
+from commands.text_outputs import iter_calib_points, iter_sampling_results, is_sampling_file
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    directory TEXT UNIQUE NOT NULL,
+    label TEXT,
+    date TEXT,
+    sample_select INTEGER,
+    delta_t INTEGER,
+    cal_pulse INTEGER,
+    win_width REAL,
+    trials_num INTEGER,
+    indexed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    path TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS calib_points (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    channel INTEGER NOT NULL,
+    dac_setting INTEGER NOT NULL,
+    n INTEGER, mean REAL, std REAL, min_count INTEGER, max_count INTEGER,
+    counts TEXT
+);
+CREATE TABLE IF NOT EXISTS sampling_results (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    block INTEGER NOT NULL,
+    finished_at TEXT,
+    win_width REAL,
+    channel INTEGER NOT NULL,
+    n INTEGER, mean REAL, std REAL, min_count INTEGER, max_count INTEGER,
+    counts TEXT
+);
+CREATE INDEX IF NOT EXISTS calib_channel ON calib_points(channel, dac_setting);
+CREATE INDEX IF NOT EXISTS calib_file ON calib_points(file_id);
+CREATE INDEX IF NOT EXISTS sampling_channel ON sampling_results(channel);
+CREATE INDEX IF NOT EXISTS sampling_file ON sampling_results(file_id);
+'''
+
+RUN_FIELDS = ('label', 'date', 'sample_select', 'delta_t', 'cal_pulse', 'win_width', 'trials_num')
+MONTHS = {m: i + 1 for i, m in enumerate(('jan', 'feb', 'mar', 'apr', 'may', 'jun',
+                                          'jul', 'aug', 'sep', 'oct', 'nov', 'dec'))}
+JOURNAL_NAME = 'calib_journal.jsonl'
+
+_CALIB_FILE = re.compile(r'ch(\d+)_calib.*\.txt$')
+_MONTH_DAY = re.compile(r'([a-z]{3})(\d{1,2})$')
+_FLAG = re.compile(r'(samp|cal|dt|win|trials)(.+)$')
+
+def open_index(filename):
+    conn = sqlite3.connect(filename)
+    conn.executescript(SCHEMA)
+    return conn
+
+# --- RUN SETTINGS ---
+
+def _flag(value):
+    return {'true': 1, 'false': 0, '1': 1, '0': 0}.get(value.lower())
+
+def parse_run_name(name):
+    """
+    Run settings from a directory name such as outputs_1_sampTrue_calFalse or
+    outputs_feb13_run1; unrecognised tokens become the label.
+    """
+    meta, label = {}, []
+    tokens = name.split('_')
+    if tokens and tokens[0] == 'outputs':
+        tokens = tokens[1:]
+    for token in tokens:
+        md = _MONTH_DAY.match(token.lower())
+        flag = _FLAG.match(token)
+        if token.isdigit() and 'delta_t' not in meta:
+            meta['delta_t'] = int(token)
+        elif md and md.group(1) in MONTHS:
+            meta['date'] = f'--{MONTHS[md.group(1)]:02d}-{int(md.group(2)):02d}'
+        elif flag and flag.group(1) in ('samp', 'cal') and _flag(flag.group(2)) is not None:
+            meta['sample_select' if flag.group(1) == 'samp' else 'cal_pulse'] = _flag(flag.group(2))
+        elif flag and flag.group(1) == 'dt' and flag.group(2).isdigit():
+            meta['delta_t'] = int(flag.group(2))
+        elif flag and flag.group(1) == 'trials' and flag.group(2).isdigit():
+            meta['trials_num'] = int(flag.group(2))
+        elif flag and flag.group(1) == 'win':
+            try:
+                meta['win_width'] = float(flag.group(2))
+            except ValueError:
+                label.append(token)
+        else:
+            label.append(token)
+    if label:
+        meta['label'] = '_'.join(label)
+    return meta
+
+def read_journal_plan(filename):
+    """Run settings from the plan record (first line) of a calibration journal."""
+    try:
+        with open(filename) as f:
+            record = json.loads(f.readline())
+    except (OSError, ValueError):
+        return {}
+    plan = record.get('plan') if record.get('type') == 'plan' else None
+    if not plan:
+        return {}
+    meta = {k: plan.get(k) for k in ('sample_select', 'delta_t', 'win_width', 'trials_num')}
+    meta['cal_pulse'] = int(bool(plan.get('cal_pulse')))
+    if record.get('started'):
+        meta['date'] = record['started'][:10]
+    return {k: v for k, v in meta.items() if v is not None}
+
+# --- STATISTICS ---
+
+def count_stats(counts):
+    """(n, mean, sample std, min, max); std is 0 for a single trial."""
+    n = len(counts)
+    if not n:
+        return 0, None, None, None, None
+    mean = sum(counts) / n
+    std = (sum((x - mean) ** 2 for x in counts) / (n - 1)) ** 0.5 if n > 1 else 0.0
+    return n, mean, std, min(counts), max(counts)
+
+# --- INDEXING ---
+
+def _stats_columns(counts):
+    counts = counts.tolist()
+    return (*count_stats(counts), json.dumps(counts))
+
+def _run_id(conn, directory):
+    row = conn.execute('SELECT id FROM runs WHERE directory = ?', (directory,)).fetchone()
+    if row:
+        return row[0]
+    return conn.execute('INSERT INTO runs (directory) VALUES (?)', (directory,)).lastrowid
+
+def _drop_file(conn, file_id):
+    conn.execute('DELETE FROM calib_points WHERE file_id = ?', (file_id,))
+    conn.execute('DELETE FROM sampling_results WHERE file_id = ?', (file_id,))
+    conn.execute('DELETE FROM files WHERE id = ?', (file_id,))
+
+def _index_file(conn, run_id, path, kind, st):
+    file_id = conn.execute('INSERT INTO files (run_id, path, kind, size, mtime_ns) VALUES (?, ?, ?, ?, ?)',
+                           (run_id, path, kind, st.st_size, st.st_mtime_ns)).lastrowid
+    if kind == 'calib':
+        channel = int(_CALIB_FILE.search(os.path.basename(path)).group(1))
+        conn.executemany(
+            'INSERT INTO calib_points VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((file_id, run_id, channel, dac, *_stats_columns(counts))
+             for dac, counts in iter_calib_points(path)))
+    else:
+        conn.executemany(
+            'INSERT INTO sampling_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((file_id, run_id, r.block, r.finished_at, r.win_width, r.channel, *_stats_columns(r.counts))
+             for r in iter_sampling_results(path)))
+
+def _file_kind(path):
+    name = os.path.basename(path)
+    if _CALIB_FILE.match(name):
+        return 'calib'
+    if name.endswith('.txt') and is_sampling_file(path):
+        return 'sampling'
+    return None
+
+def index_run(conn, directory):
+    """
+    Brings one output directory up to date in the catalog: new and changed
+    text files are (re)parsed, vanished ones dropped, and the run settings
+    re-derived. Returns the number of files parsed.
+    """
+    directory = os.path.normpath(directory)
+    parsed = 0
+    with conn:
+        run_id = _run_id(conn, directory)
+        known = {path: (file_id, size, mtime_ns) for file_id, path, size, mtime_ns in conn.execute(
+            'SELECT id, path, size, mtime_ns FROM files WHERE run_id = ?', (run_id,))}
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            old = known.pop(path, None)
+            if old and old[1:] == (st.st_size, st.st_mtime_ns):
+                continue
+            if old:
+                _drop_file(conn, old[0])
+            kind = _file_kind(path)
+            if kind:
+                _index_file(conn, run_id, path, kind, st)
+                parsed += 1
+        for file_id, _, _ in known.values():
+            _drop_file(conn, file_id)
+
+        meta = {}
+        first = conn.execute('SELECT finished_at, win_width FROM sampling_results WHERE run_id = ? '
+                             'ORDER BY finished_at LIMIT 1', (run_id,)).fetchone()
+        if first and first[0]:
+            meta['date'] = first[0][:10]
+        meta.update(parse_run_name(os.path.basename(directory)))
+        meta.update(read_journal_plan(os.path.join(directory, JOURNAL_NAME)))
+        conn.execute(f'UPDATE runs SET {", ".join(f"{k} = ?" for k in RUN_FIELDS)}, indexed_at = ? WHERE id = ?',
+                     [meta.get(k) for k in RUN_FIELDS] + [str(datetime.datetime.now()), run_id])
+    return parsed
+
+def index_outputs(conn, directories=None):
+    """
+    Indexes every outputs* directory in the working directory (or the ones
+    given) and forgets runs whose directory no longer exists. Returns
+    {directory: files parsed}.
+    """
+    if directories is None:
+        directories = sorted(d for d in glob.glob('outputs*') if os.path.isdir(d))
+    with conn:
+        for run_id, directory in conn.execute('SELECT id, directory FROM runs').fetchall():
+            if not os.path.isdir(directory):
+                for (file_id,) in conn.execute('SELECT id FROM files WHERE run_id = ?', (run_id,)).fetchall():
+                    _drop_file(conn, file_id)
+                conn.execute('DELETE FROM runs WHERE id = ?', (run_id,))
+    return {d: index_run(conn, d) for d in directories}
+
+# --- QUERIES ---
+
+def channel_history(conn, channel, month=None, directory_like=None):
+    """
+    Calibration points of one channel across runs, optionally limited to a month
+    or to directories matching an SQL LIKE pattern.
+    """
+    query = ('SELECT r.directory, r.date, r.sample_select, r.delta_t, r.cal_pulse, f.path, '
+             'p.dac_setting, p.n, p.mean, p.std FROM calib_points p '
+             'JOIN runs r ON r.id = p.run_id JOIN files f ON f.id = p.file_id WHERE p.channel = ?')
+    params = [channel]
+    if month is not None:
+        query += ' AND substr(r.date, -5, 2) = ?'
+        params.append(f'{month:02d}')
+    if directory_like is not None:
+        query += ' AND r.directory LIKE ?'
+        params.append(directory_like)
+    query += ' ORDER BY r.date, r.directory, f.path, p.dac_setting'
+    return conn.execute(query, params).fetchall()
@@ -1,13 +1,20 @@
+import math
 import time
+from array import array
 from commands.helper_functions import *
 
 # --- OPTIMIZATION: Cache working channels once at module level ---
 # This prevents re-reading the CSV file every time sample_working_channels is called.
 _cached_working_channels = get_channels_in_use()
 
-def sample_channel(c): 
-    """Samples one channel using fast mmap reads."""
-    timestamps = []
+def sample_channel(c, timestamps=None): 
+    """
+    Samples one channel using fast mmap reads. Timestamps are appended to
+    `timestamps` (a list or array('Q')) when given, otherwise to a new list.
+    """
+    if timestamps is None:
+        timestamps = []
+    start = len(timestamps)
     # No changes needed to the logic, but because read_ch_status and read_ch_fifo 
     # now use mmap peek/poke, this loop will be ~100x faster.
     
@@ -26,58 +33,247 @@ def sample_channel(c):
     # Optional: Removing the print statement inside the loop saves even more time 
     # if you are calling this hundreds of times.
     # print(f'\tChannel {c} counts: {len(timestamps)}')
-    return len(timestamps), timestamps
+    return len(timestamps) - start, timestamps
 
-def sample_working_channels(): 
-    """Sample all working channels using the cached channel list."""
+def sample_working_channels(out=None, profiler=None): 
+    """
+    Sample all working channels using the cached channel list. `out` is an
+    optional list of 16 per-channel sequences to append timestamps to, and
+    profiler an optional TrialProfiler timing each channel's drain.
+    """
     trial_counts = [0] * 16
-    trial_timestamps = [[] for _ in range(16)] 
-    
-    # Iterate through the cached list directly for better performance
+    trial_timestamps = out if out is not None else [[] for _ in range(16)]
+
+    # Each channel's status is read when its turn comes (sample_channel stops
+    # on an empty FIFO), so hits arriving while earlier channels drain are kept
     for c in range(15, -1, -1):
         if c in _cached_working_channels:
-            count, timestamps = sample_channel(c)
+            count, _ = sample_channel(c, trial_timestamps[c])
             trial_counts[c] = count
-            trial_timestamps[c] = timestamps
+            if profiler: profiler.mark_channel(c)
+    return trial_counts, trial_timestamps
+
+def sample_channels_parallel(channels=None, out=None):
+    """
+    Drains all working channels together: every non-empty channel is popped
+    by the same strobe, so each round costs one status read, two strobe pokes
+    and one timestamp block read regardless of how many channels have data.
+    """
+    if channels is None:
+        channels = _cached_working_channels
+    trial_timestamps = out if out is not None else [[] for _ in range(16)]
+    start = [len(timestamps) for timestamps in trial_timestamps]
+
+    pending = non_empty_channels(channels)
+    while pending:
+        words = read_fifos(pending)
+        for c in range(16):
+            if pending & (1 << c):
+                trial_timestamps[c].append(words[c])
+        pending = non_empty_channels(channels)
+
+    trial_counts = [len(trial_timestamps[c]) - start[c] for c in range(16)]
     return trial_counts, trial_timestamps
 
+class TrialView:
+    """One trial of a TimestampBuffer, indexed by channel like the old nested lists."""
+    def __init__(self, buffer, t):
+        self.buffer = buffer
+        self.t = t
+
+    def __len__(self):
+        return len(self.buffer.data)
+
+    def __getitem__(self, c):
+        if isinstance(c, slice):
+            return [self[i] for i in range(*c.indices(len(self)))]
+        return self.buffer.trial(self.t, c)
+
+    def tolist(self):
+        return [self.buffer.trial(self.t, c).tolist() for c in range(len(self))]
+
+class TimestampBuffer:
+    """
+    Timestamps of a run of trials, as one array('Q') per channel plus per-trial offsets.
+    buffer[trial][channel] reads like the old nested lists.
+    """
+    def __init__(self, channels=16):
+        self.data = [array('Q') for _ in range(channels)]
+        self.offsets = [array('Q', [0]) for _ in range(channels)]
+
+    def __len__(self):
+        return len(self.offsets[0]) - 1
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            return [self[i] for i in range(*t.indices(len(self)))]
+        if t < 0:
+            t += len(self)
+        if not 0 <= t < len(self):
+            raise IndexError('trial index out of range')
+        return TrialView(self, t)
+
+    def end_trial(self):
+        """Closes the current trial: records where it ends in every channel."""
+        for c in range(len(self.data)):
+            self.offsets[c].append(len(self.data[c]))
+
+    def trial(self, t, c):
+        """Timestamps of channel c in trial t, as an array('Q')."""
+        return self.data[c][self.offsets[c][t]:self.offsets[c][t+1]]
+
+    def add_trial(self, trial_timestamps):
+        """Appends one trial given as 16 per-channel sequences."""
+        for c in range(len(self.data)):
+            self.data[c].extend(trial_timestamps[c])
+        self.end_trial()
+
+    def counts(self, t):
+        """Per-channel counts of trial t."""
+        return [o[t+1] - o[t] for o in self.offsets]
+
+    def as_lists(self):
+        """The old [trial][channel][timestamp] nested list shape."""
+        return [[self.trial(t, c).tolist() for c in range(len(self.data))]
+                for t in range(len(self))]
+
+def iter_trials(trials_num=None, win_width=64e-6, win_wait=10e-6, reset_width=50e-6,
+                rst_cal_gap=100e-9, external_clock=True, cal_pulse=False,
+                sampling=False, file_writer=None, parallel_drain=False,
+                profiler=None):
+    """
+    Streaming form of sample_n_trials: yields (trial, counts, timestamps) as soon
+    as each trial has been drained. trials_num=None runs until the caller stops.
+    """
+    prof = profiler
+    if prof: prof.begin_run()
+    try:
+        # These functions now use mmap.poke internally
+        set_win_width(win_width)
+        set_win_wait(win_wait)
+        set_reset_width(reset_width)
+        set_rst_cal_gap(rst_cal_gap)
+
+        startup() 
+        if prof: prof.end_configure()
+        j = 0
+        while trials_num is None or j < trials_num:
+            start_time = time.perf_counter()
+            if prof: prof.start_trial(j)
+            
+            # Direct bit manipulation via mmap is now used in these helper calls
+            set_ext_clock(1 if external_clock else 0)
+            
+            if cal_pulse: calibration_pulse()
+            if sampling: sample_pulse()
+            print(f"\tTrial: {j+1} of {trials_num}")
+            if prof: prof.mark('arm')
+            
+            # This is where the heavy lifting happens
+            trial_timestamps = [array('Q') for _ in range(16)]
+            if parallel_drain:
+                trial_counts, _ = sample_channels_parallel(out=trial_timestamps)
+            else:
+                trial_counts, _ = sample_working_channels(out=trial_timestamps, profiler=prof)
+            if prof: prof.end_drain(trial_counts)
+            
+            startup() # Deasserts sequences
+            if prof: prof.mark('reset')
+            
+            duration = time.perf_counter() - start_time
+            msg = f"Trial {j}: {duration:.6f} seconds"
+            print(msg)
+            if file_writer:
+                file_writer.write(msg + "\n")
+            if prof: prof.end_trial()
+
+            yield j, trial_counts, trial_timestamps
+            j += 1
+    finally:
+        # also reached when the caller stops early (iter_adaptive_trials)
+        if prof:
+            prof.mark('write')
+            prof.end_run()
+
 def sample_n_trials(trials_num, win_width=64e-6, win_wait=10e-6, reset_width=50e-6,
                     rst_cal_gap=100e-9, external_clock=True, cal_pulse=False, 
-                    sampling=False, file_writer=None):
-    
-    # These functions now use mmap.poke internally
-    set_win_width(win_width)
-    set_win_wait(win_wait)
-    set_reset_width(reset_width)
-    set_rst_cal_gap(rst_cal_gap)
-
+                    sampling=False, file_writer=None, parallel_drain=False,
+                    timestamps_as_lists=False, profiler=None):
+    """
+    Runs trials_num trials and returns (all_counts, all_timestamps), where
+    all_counts is [trial][channel] and all_timestamps is a TimestampBuffer.
+    Pass timestamps_as_lists=True to get the old nested-list shape instead.
+    """
     all_counts = [] 
-    all_timestamps = [] 
+    all_timestamps = TimestampBuffer()
 
-    startup() 
-    for j in range(trials_num): 
-        start_time = time.perf_counter()
-        
-        # Direct bit manipulation via mmap is now used in these helper calls
-        set_ext_clock(1 if external_clock else 0)
-        
-        if cal_pulse: calibration_pulse()
-        if sampling: sample_pulse()
-        
-        print(f"\tTrial: {j+1} of {trials_num}")
-        
-        # This is where the heavy lifting happens
-        trial_counts, trial_timestamps = sample_working_channels()
-        
+    for _, trial_counts, trial_timestamps in iter_trials(
+            trials_num, win_width=win_width, win_wait=win_wait,
+            reset_width=reset_width, rst_cal_gap=rst_cal_gap,
+            external_clock=external_clock, cal_pulse=cal_pulse,
+            sampling=sampling, file_writer=file_writer,
+            parallel_drain=parallel_drain, profiler=profiler):
         all_counts.append(trial_counts)
-        all_timestamps.append(trial_timestamps)
-        
-        startup() # Deasserts sequences
-        
-        duration = time.perf_counter() - start_time
-        msg = f"Trial {j}: {duration:.6f} seconds"
-        print(msg)
-        if file_writer:
-            file_writer.write(msg + "\n")
-            
+        all_timestamps.add_trial(trial_timestamps)
+
+    if timestamps_as_lists:
+        return all_counts, all_timestamps.as_lists()
     return all_counts, all_timestamps
+
+# Two-sided 95% Student t quantiles for 1-30 degrees of freedom
+_T95 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042)
+
+class ChannelStats:
+    """
+    Running mean and variance (Welford) of the per-trial counts of each
+    channel, updated in O(1) per trial without keeping the counts.
+    """
+    def __init__(self, channels=range(16)):
+        self.channels = list(channels)
+        self.n = 0
+        self.means = [0.0] * 16
+        self._m2 = [0.0] * 16
+
+    def add(self, counts):
+        self.n += 1
+        for c in self.channels:
+            delta = counts[c] - self.means[c]
+            self.means[c] += delta / self.n
+            self._m2[c] += delta * (counts[c] - self.means[c])
+
+    def variance(self, c):
+        return self._m2[c] / (self.n - 1) if self.n > 1 else math.inf
+
+    def half_width(self, c):
+        """Half-width of the 95% confidence interval of channel c's mean count."""
+        if self.n < 2:
+            return math.inf
+        t = _T95[self.n - 2] if self.n - 1 <= len(_T95) else 1.96
+        # Reset counts are Poisson: a few equal trials give a sample variance of 0,
+        # so never assume less spread than the mean itself
+        return t * math.sqrt(max(self.variance(c), self.means[c]) / self.n)
+
+    def precise(self, precision=0.0, rel_precision=0.0):
+        """True once every channel's half-width is within precision counts or rel_precision of its mean."""
+        return all(self.half_width(c) <= max(precision, rel_precision * abs(self.means[c]))
+                   for c in self.channels)
+
+def iter_adaptive_trials(max_trials, precision=0.0, rel_precision=0.0, min_trials=2,
+                         channels=None, stats=None, **trial_kwargs):
+    """
+    iter_trials() that stops once every channel's mean is known to precision or
+    rel_precision (after min_trials), or after max_trials.
+    """
+    if stats is None:
+        stats = ChannelStats(_cached_working_channels if channels is None else channels)
+    trials = iter_trials(max_trials, **trial_kwargs)
+    try:
+        for trial in trials:
+            stats.add(trial[1])
+            yield trial
+            if stats.n >= min_trials and stats.precise(precision, rel_precision):
+                break
+    finally:
+        trials.close()
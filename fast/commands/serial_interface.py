@@ -1,55 +1,180 @@
 #### SERIAL INTERFACE ############################
 # Authors: AN, ACG
-# Usage: python3 serial_interface.py [1 or 2] [data in 32-bit hex]
+# Usage: python3 serial_interface.py [1 or 2] [data in 32-bit hex] [shift clock Hz, optional]
 # Notes: reset serial interfaces first
 ##################################################
 
+import os
+import json
 import time
 from commands.helper_functions import poke, peek
 
-def send_serial_command(interface, data):
+class SerialTiming:
     """
-    Direct mmap-based replacement for the serial_interface.py script.
-    Writes data into the internal register of the QPix interface.
+    Hold times (s) after each step of the serial shift sequence. ready=(addr, mask)
+    polls a status bit instead of sleeping the full shift time.
     """
-    # Assuming the data_addr logic from your previous snippet
-    # If 'interface' determines the address, adjust this mapping:
-    # interface 1 -> 0x43c00008, interface 2 -> 0x43c0000c, etc.
-    base_data_addr = 0x43c00008
-    data_addr = base_data_addr + ((int(interface) - 1) * 8)
+    def __init__(self, data=0.5, load=0.5, load_release=0.5, shift_enable=0.01,
+                 shift=0.5, ready=None, timeout=1.0):
+        self.data = data
+        self.load = load
+        self.load_release = load_release
+        self.shift_enable = shift_enable
+        self.shift = shift
+        self.ready = ready
+        self.timeout = timeout
+
+    @classmethod
+    def from_clock(cls, clock_hz, bits=32, margin=4.0, ready=None):
+        """
+        Minimal hold times for a gated shift clock of clock_hz: the load
+        pulse lasts a few clock periods and the shift step covers all bits,
+        each stretched by margin.
+        """
+        period = 1.0 / clock_hz
+        return cls(data=0, load=4 * period * margin, load_release=period * margin,
+                   shift_enable=period * margin, shift=bits * period * margin,
+                   ready=ready)
+
+    def total(self):
+        return self.data + self.load + self.load_release + self.shift_enable + self.shift
+
+# The original fixed sleeps, kept as the default until a faster profile has
+# been validated on the board. QPIX_SERIAL_CLOCK_HZ=<Hz> switches every
+# caller (init.py, configure.py, the calibration and sweep scripts) to the
+# hold times derived from that shift clock instead.
+LEGACY_TIMING = SerialTiming()
+default_timing = LEGACY_TIMING
+
+def set_default_timing(timing):
+    """Hold times used by send_serial_command(s) when none are passed."""
+    global default_timing
+    default_timing = timing
+
+if os.environ.get('QPIX_SERIAL_CLOCK_HZ'):
+    set_default_timing(SerialTiming.from_clock(float(os.environ['QPIX_SERIAL_CLOCK_HZ'])))
+
+# --- SHADOW OF THE PROGRAMMED WORDS ------------
+# Last word successfully shifted into each interface. Writing the word an
+# interface already holds is skipped. With QPIX_SERIAL_CACHE=<file> (or
+# set_serial_cache_file()) the shadow is kept in that file, so separate
+# processes share it. The file outlives the chip's registers: a persisted
+# cache must be cleared (invalidate_serial_cache()) on every power cycle or
+# interface reset, or later writes are skipped for words the chip no longer
+# holds. init.py and serial_interface_rst.py clear it.
+_shadow = {}
+_shadow_file = None
 
-    # Convert hex string input to integer
-    if isinstance(data, str):
-        data_int = int(data, 16)
+def set_serial_cache_file(path):
+    """Persists the shadow in path, picking up whatever an earlier run left there."""
+    global _shadow_file
+    _shadow_file = path
+    if path and os.path.exists(path):
+        with open(path) as f:
+            _shadow.update({int(k): v for k, v in json.load(f).items()})
+
+def _save_shadow():
+    if _shadow_file:
+        with open(_shadow_file, 'w') as f:
+            json.dump(_shadow, f)
+
+def invalidate_serial_cache(interface=None):
+    """Forgets the shadowed word of one interface, or of both."""
+    if interface is None:
+        _shadow.clear()
     else:
-        data_int = data
+        _shadow.pop(int(interface), None)
+    _save_shadow()
 
-    # Write data into internal reg
-    poke(data_addr, data_int)
-    time.sleep(0.5)
+def get_shadowed_word(interface):
+    return _shadow.get(int(interface))
+
+set_serial_cache_file(os.environ.get('QPIX_SERIAL_CACHE'))
+
+# -----------------------------------------------
+
+def _hold(t, ready=None, timeout=1.0):
+    if ready is None:
+        if t > 0: time.sleep(t)
+        return
+    addr, mask = ready
+    deadline = time.perf_counter() + timeout
+    while not peek(addr) & mask:
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f'Serial interface not ready after {timeout} s')
 
+def send_serial_command(interface, data, timing=None, force=False):
+    """
+    Writes data into the internal register of the QPix interface. Returns False
+    without touching it if it already holds data, unless force is set.
+    """
+    return send_serial_commands({interface: data}, timing, force)[int(interface)]
+
+def send_serial_commands(words, timing=None, force=False):
+    """
+    Programs several serial interfaces at once, e.g. {1: word1, 2: word2}, with
+    shared hold times. Returns {interface: True if the word was shifted}.
+    """
+    if timing is None:
+        timing = default_timing
+
+    # interface 1 -> data 0x43c00008, ctrl 0x43c00004
+    # interface 2 -> data 0x43c00010, ctrl 0x43c0000c
+    base_data_addr = 0x43c00008
     base_ctrl_addr = 0x43c00004
-    ctrl_addr = base_ctrl_addr + ((int(interface) - 1) * 8)
+
+    sent = {}
+    targets = {}
+    for interface, data in words.items():
+        interface = int(interface)
+        # Convert hex string input to integer
+        data_int = int(data, 16) if isinstance(data, str) else data
+        if not force and _shadow.get(interface) == data_int:
+            print(f'Interface {interface} already holds 0x{data_int:08X}, skipping.')
+            sent[interface] = False
+        else:
+            targets[interface] = data_int
+            sent[interface] = True
+    if not targets:
+        return sent
+
+    data_addrs = {i: base_data_addr + (i - 1) * 8 for i in targets}
+    ctrl_addrs = [base_ctrl_addr + (i - 1) * 8 for i in targets]
+
+    def set_ctrl(value):
+        for ctrl_addr in ctrl_addrs:
+            poke(ctrl_addr, value)
+
+    # Write data into internal reg
+    for interface, data_int in targets.items():
+        poke(data_addrs[interface], data_int)
+    _hold(timing.data)
 
     # bit 1, loading data into FPGA shift register
-    poke(ctrl_addr, 0x00000002)
-    time.sleep(0.5)
-    poke(ctrl_addr, 0x00000000)
-    time.sleep(0.5)
+    set_ctrl(0x00000002)
+    _hold(timing.load)
+    set_ctrl(0x00000000)
+    _hold(timing.load_release)
 
     # bit 2, shift out to QPix with gated clock
-    poke(ctrl_addr, 0x00000004)
-    time.sleep(0.01)
+    set_ctrl(0x00000004)
+    _hold(timing.shift_enable)
  
     # bit 8, shift out to QPix with gated clock
-    poke(ctrl_addr, 0x00000100)
-    time.sleep(0.5)
+    set_ctrl(0x00000100)
+    _hold(timing.shift, timing.ready, timing.timeout)
 
     # de-assert bits 2 and 8
-    poke(ctrl_addr, 0x00000000)
+    set_ctrl(0x00000000)
+
+    _shadow.update(targets)
+    _save_shadow()
+    return sent
 
 if __name__ == "__main__":
     # Allows the script to still be run from the command line if needed
     import sys
-    if len(sys.argv) > 2:
+    if len(sys.argv) > 3:
+        send_serial_command(sys.argv[1], sys.argv[2], SerialTiming.from_clock(float(sys.argv[3])))
+    elif len(sys.argv) > 2:
         send_serial_command(sys.argv[1], sys.argv[2])
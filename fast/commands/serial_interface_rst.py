@@ -32,3 +32,9 @@ time.sleep(0.5)
 
 os.system('poke 0x43c0000c 0x00000000')
 print ('De-asserting opad2_selDefData')
+
+# The interfaces are back to their default data: forget any shadowed words
+# (see QPIX_SERIAL_CACHE in serial_interface.py)
+cache_file = os.environ.get('QPIX_SERIAL_CACHE')
+if cache_file and os.path.exists(cache_file):
+    os.remove(cache_file)
@@ -4,36 +4,18 @@
 # Notes: sets vref and vset for DAC7578
 ##############################################
 
-import sys
-import os
-import time
-import math
+from i2c_dacs import dac7578_counts, set_dac7578_all
 
 ### USER INPUTS ####
 vref = 1.6
 vset = 0.8
 ####################
 
-dac_addr = "0x48"
-
 # 12-bit DAC
-steps = vref/4096
-if (vset <= 0):
-	counts = 0x000
-	print ("Invalid voltage specified! Value should be 0 - " + str(vset) + " V")
-elif (vset >= vref):
-	counts = 0xfff
-	print ("Invalid voltage specified! Value should be 0 - " + str(vset) + " V")
-else:
-	counts = math.floor(vset/steps)
-
-# Set all 8 channels
-counts_formatted = str.format('{:04X}', counts << 4)
-msn = counts_formatted[0:2] 
-lsn = counts_formatted[2:4]
-
-for channel in range(0, 8):
-	command = 'i2cset -y 1 ' + dac_addr + ' 0x0' + str(channel) + ' 0x' + msn + ' 0x' + lsn + ' i'
-	print ("Sending command: " + command)
-	i2c_raw = os.popen(command).read()
+if not 0 < vset < vref:
+	print ("Invalid voltage specified! Value should be 0 - " + str(vref) + " V")
+counts = dac7578_counts(vset, vref)
 
+# Set all 8 channels (one broadcast write)
+print (f"Setting all 8 channels to 0x{counts:03X} ({vset} V)")
+set_dac7578_all(counts)
@@ -5,50 +5,19 @@
 ##############################################
 
 import sys
-import os
-import time
-import math
+from i2c_dacs import set_dac10, DAC10_ADDRS, DAC10_CHANNELS
 
 # U74
-if sys.argv[1] == "TP":
-	dac_addr = "0x0d"
-elif sys.argv[1] == "VCOMP":
-	dac_addr = "0x0c"
-else:
-	dac_addr = "0x00"
+if sys.argv[1] not in DAC10_ADDRS:
 	print("Invalid DAC specified! Choices are TP or VCOMP")
+	sys.exit(1)
 
 # U65
-if sys.argv[2] == "1":
-	channel = "0x01"
-elif sys.argv[2] == "2":
-	channel = "0x02"
-else:
-	channel = "0x00"
+if sys.argv[2] not in ('1', '2'):
 	print("Invalid channel specified! Choices are 1 or 2")
+	sys.exit(1)
 
-# 10-bit DAC
-steps = 1.2/1024
-voltage = float(sys.argv[3])
-if (voltage < 0):
-	counts = 0
-	print ("Invalid voltage specified! Value should be 0 - 1.2V")
-elif (1.194 < voltage <= 1.2):
-	counts = 0x3ff
-elif (voltage > 1.2):
-	counts = 0x3ff
-	print ("Invalid voltage specified! Value should be 0 - 1.2V")
-else:
-	counts = math.floor(voltage/steps)
-
-# Xilinx I2C commands are byte-swapped
-counts_formatted = str.format('0x{:04X}', counts << 2)
-msb = counts_formatted[3:4]
-lsb = counts_formatted[4:6]
-ctrl_bits = "2"
-word = '0x' + lsb + ctrl_bits + msb
-
-command = 'i2cset -y 0 ' + dac_addr + ' ' + channel + ' ' + word + ' w'
-print ("Sending command: " + command)
-i2c_raw = os.popen(command).read()
-
+# 10-bit DAC, Xilinx I2C words are byte-swapped (see i2c_dacs.dac10_word)
+word = set_dac10(sys.argv[1], sys.argv[2], float(sys.argv[3]))
+print(f"Set {sys.argv[1]} {sys.argv[2]}: addr 0x{DAC10_ADDRS[sys.argv[1]]:02x}, "
+      f"cmd 0x{DAC10_CHANNELS[int(sys.argv[2])]:02x}, word 0x{word:04X}")
@@ -0,0 +1,351 @@
+### LEGACY TEXT OUTPUTS #########################
+# Usage: from commands.text_outputs import *
+# Notes: single-pass, chunked parser for the chN_calib.txt and run_sampling.py
+#        text files, producing arrays and columnar tables
+#################################################
+#
+# Formats (as written by CalibTextSink and SamplingTextWriter):
+#
+#   chN_calib.txt      DAC setting: 12
+#                      Counts: [68, 68, 67]
+#                      Mean: 67.67
+#                      ...
+#
+#   sampling files     Sampling results below finished at: 2025-04-21 23:25:35.758771
+#                      Window Width : 0.0001
+#                      Channel 0 results
+#                      Counts: [24]
+#                      Avg Count: 24.0
+#                      Trial 0 timestamps: [403146767839, 403146767869, ...]
+#                      (blank line, next channel, ...)
+#                      ******************************************************
+#                      (next block, appended by a later run)
+#
+# Files are read in chunk_size pieces and number lists are converted a chunk
+# at a time, so memory does not grow with the file or with the length of a
+# timestamp line. Numbers are parsed with np.fromstring when NumPy is
+# available (several hundred MB/s), otherwise with int() into array('q'/'Q');
+# list reprs are never eval'd.
+
+import os
+from array import array
+from commands.timestamp_file import TimestampFileWriter, CHANNELS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHUNK_SIZE = 1 << 20
+SAMPLING_HEADER = b'Sampling results below finished at:'
+_TRIAL = b'Trial '
+
+# _scan() events
+_LINE, _LIST_START, _LIST_PART, _LIST_END = range(4)
+
+def parse_ints(text, unsigned=False):
+    """
+    Comma-separated integers ('1, 2, 3', bytes or str, no brackets) as a
+    NumPy int64/uint64 array, or array('q'/'Q') without NumPy. Raises
+    ValueError on anything that is not a number.
+    """
+    if isinstance(text, str):
+        text = text.encode()
+    if not text.strip():
+        return np.zeros(0, np.uint64 if unsigned else np.int64) if np is not None else array('Q' if unsigned else 'q')
+    if np is not None:
+        values = np.fromstring(text, dtype=np.uint64 if unsigned else np.int64, sep=',')
+        if len(values) != text.count(b',') + 1:
+            raise ValueError(f'Malformed number list: {text[:80]!r}')
+        return values
+    return array('Q' if unsigned else 'q', map(int, text.split(b',')))
+
+def _concat(parts, unsigned=True):
+    if not parts:
+        return parse_ints(b'', unsigned)
+    if len(parts) == 1:
+        return parts[0]
+    if np is not None:
+        return np.concatenate(parts)
+    out = parts[0]
+    for part in parts[1:]:
+        out.extend(part)
+    return out
+
+def _scan(f, chunk_size=CHUNK_SIZE, in_list=False):
+    """
+    Splits a binary file into _LINE, _LIST_START, _LIST_PART and _LIST_END events,
+    carrying only an unfinished line or number between chunks.
+    """
+    base = f.tell()
+    buf = b''
+    skip_line = False
+    while True:
+        chunk = f.read(chunk_size)
+        buf += chunk
+        pos = 0
+        while pos < len(buf):
+            if in_list:
+                end = buf.find(b']', pos)
+                if end < 0:
+                    if not chunk:
+                        raise ValueError(f'Unterminated number list at byte {base + pos}')
+                    cut = buf.rfind(b',', pos)
+                    if cut > pos:
+                        yield _LIST_PART, base + pos, buf[pos:cut]
+                        pos = cut + 1
+                    break
+                yield _LIST_END, base + pos, buf[pos:end]
+                pos = end + 1
+                in_list = False
+                skip_line = True
+            elif skip_line:
+                nl = buf.find(b'\n', pos)
+                if nl < 0:
+                    pos = len(buf)
+                    break
+                pos = nl + 1
+                skip_line = False
+            else:
+                nl = buf.find(b'\n', pos)
+                if buf.startswith(_TRIAL, pos):
+                    lb = buf.find(b'[', pos, nl if nl >= 0 else len(buf))
+                    if lb >= 0:
+                        yield _LIST_START, base + lb + 1, buf[pos:lb]
+                        pos = lb + 1
+                        in_list = True
+                        continue
+                if nl < 0:
+                    if not chunk:
+                        yield _LINE, base + pos, buf[pos:]
+                        pos = len(buf)
+                    break
+                yield _LINE, base + pos, buf[pos:nl].rstrip(b'\r')
+                pos = nl + 1
+        base += pos
+        buf = buf[pos:]
+        if not chunk:
+            return
+
+def _field(line):
+    return line.split(b':', 1)[1]
+
+def _int_list_field(line):
+    return parse_ints(_field(line).strip().strip(b'[]'))
+
+# --- CALIBRATION FILES ---
+
+def iter_calib_points(filename, chunk_size=CHUNK_SIZE):
+    """(dac_setting, counts array) for every block of a chN_calib.txt file."""
+    dac = None
+    with open(filename, 'rb') as f:
+        for event, _, data in _scan(f, chunk_size):
+            if event != _LINE:
+                continue
+            if data.startswith(b'DAC setting:'):
+                dac = int(_field(data))
+            elif data.startswith(b'Counts:') and dac is not None:
+                yield dac, _int_list_field(data)
+                dac = None
+
+def read_calib(filename, chunk_size=CHUNK_SIZE):
+    """A chN_calib.txt file as columns, one row per trial: dac_setting, trial, count."""
+    dacs, trials, counts = array('q'), array('q'), []
+    for dac, point_counts in iter_calib_points(filename, chunk_size):
+        dacs.extend([dac] * len(point_counts))
+        trials.extend(range(len(point_counts)))
+        counts.append(point_counts)
+    return _columns({'dac_setting': dacs, 'trial': trials, 'count': _concat(counts, unsigned=False)})
+
+def _columns(table):
+    if np is None:
+        return table
+    return {k: np.asarray(v) if isinstance(v, array) else v for k, v in table.items()}
+
+# --- SAMPLING FILES ---
+
+def is_sampling_file(filename):
+    with open(filename, 'rb') as f:
+        return f.readline().startswith(SAMPLING_HEADER)
+
+class SamplingResult:
+    """One 'Channel N results' section of a sampling file."""
+    def __init__(self, block, finished_at, win_width, channel):
+        self.block = block
+        self.finished_at = finished_at
+        self.win_width = win_width
+        self.channel = channel
+        self.counts = parse_ints(b'')
+        self.avg_count = None
+        self.timestamps = None
+
+    def __repr__(self):
+        return f'SamplingResult(block={self.block}, channel={self.channel}, trials={len(self.counts)})'
+
+def _iter_sampling(filename, timestamps, chunk_size):
+    """
+    Yields ('result', SamplingResult) per channel section and, with timestamps,
+    ('trial', result, trial, array) per timestamp list.
+    """
+    block, finished_at, win_width = -1, None, None
+    result, trial, parts = None, None, []
+    with open(filename, 'rb') as f:
+        for event, _, data in _scan(f, chunk_size):
+            if event == _LIST_PART:
+                if timestamps:
+                    parts.append(parse_ints(data, unsigned=True))
+                continue
+            if event == _LIST_END:
+                if timestamps and result is not None:
+                    parts.append(parse_ints(data, unsigned=True))
+                    yield 'trial', result, trial, _concat(parts)
+                parts = []
+                continue
+            if event == _LIST_START:
+                trial = int(data.split()[1])
+                continue
+            if data.startswith(SAMPLING_HEADER):
+                if result is not None:
+                    yield 'result', result
+                block += 1
+                finished_at = data[len(SAMPLING_HEADER):].strip().decode()
+                win_width, result = None, None
+            elif data.startswith(b'Window Width'):
+                win_width = float(_field(data))
+            elif data.startswith(b'Channel ') and data.rstrip().endswith(b'results'):
+                if result is not None:
+                    yield 'result', result
+                result = SamplingResult(max(block, 0), finished_at, win_width, int(data.split()[1]))
+            elif result is not None and data.startswith(b'Counts:'):
+                result.counts = _int_list_field(data)
+            elif result is not None and data.startswith(b'Avg Count:'):
+                result.avg_count = float(_field(data))
+        if result is not None:
+            yield 'result', result
+
+def iter_sampling_results(filename, timestamps=False, chunk_size=CHUNK_SIZE):
+    """
+    SamplingResult for every channel section of a sampling file. With
+    timestamps, each result carries its trials' timestamp arrays; memory
+    then grows with one channel section, not with the file.
+    """
+    for item in _iter_sampling(filename, timestamps, chunk_size):
+        if item[0] == 'trial':
+            _, result, trial, ts = item
+            if result.timestamps is None:
+                result.timestamps = []
+            result.timestamps.append(ts)
+        else:
+            yield item[1]
+
+def iter_sampling_trials(filename, chunk_size=CHUNK_SIZE):
+    """(block, channel, trial, timestamps array) for every timestamp list, one at a time."""
+    for item in _iter_sampling(filename, True, chunk_size):
+        if item[0] == 'trial':
+            _, result, trial, ts = item
+            yield result.block, result.channel, trial, ts
+
+def read_sampling(filename, timestamps=False, chunk_size=CHUNK_SIZE):
+    """
+    A sampling file as columns, one row per (block, channel, trial). With timestamps,
+    row i's are timestamps[offsets[i]:offsets[i+1]].
+    """
+    table = {'block': array('q'), 'channel': array('q'), 'trial': array('q'), 'count': array('q'),
+             'finished_at': [], 'win_width': []}
+    ts_parts, offsets, listed = [], array('q', [0]), 0
+    for item in _iter_sampling(filename, timestamps, chunk_size):
+        if item[0] == 'trial':
+            ts_parts.append(item[3])
+            offsets.append(offsets[-1] + len(item[3]))
+            listed += 1
+            continue
+        result = item[1]
+        if timestamps and listed != len(result.counts):
+            raise ValueError(f'{filename}: channel {result.channel} of block {result.block} lists '
+                             f'{listed} trials for {len(result.counts)} counts')
+        listed = 0
+        while len(table['finished_at']) <= result.block:
+            table['finished_at'].append(result.finished_at)
+            table['win_width'].append(result.win_width)
+        n = len(result.counts)
+        table['block'].extend([result.block] * n)
+        table['channel'].extend([result.channel] * n)
+        table['trial'].extend(range(n))
+        table['count'].extend(result.counts)
+    if timestamps:
+        table['timestamps'] = _concat(ts_parts)
+        table['offsets'] = offsets
+    return _columns(table)
+
+# --- CONVERSION TO BINARY TIMESTAMP FILES ---
+
+class SamplingBlock:
+    """
+    Layout of one 'Sampling results below finished at' block: finished_at,
+    win_width and lists[channel] = byte offsets of that channel's trial
+    timestamp lists, in trial order.
+    """
+    def __init__(self, finished_at, win_width):
+        self.finished_at = finished_at
+        self.win_width = win_width
+        self.lists = {}
+
+    @property
+    def trials(self):
+        return max((len(offsets) for offsets in self.lists.values()), default=0)
+
+def index_sampling_file(filename, chunk_size=CHUNK_SIZE):
+    """SamplingBlock for every block of a sampling file, located without parsing any timestamps."""
+    blocks, channel = [], None
+    with open(filename, 'rb') as f:
+        for event, offset, data in _scan(f, chunk_size):
+            if event == _LIST_START:
+                if blocks and channel is not None:
+                    blocks[-1].lists[channel].append(offset)
+            elif event != _LINE:
+                continue
+            elif data.startswith(SAMPLING_HEADER):
+                blocks.append(SamplingBlock(data[len(SAMPLING_HEADER):].strip().decode(), None))
+                channel = None
+            elif data.startswith(b'Window Width') and blocks:
+                blocks[-1].win_width = float(_field(data))
+            elif data.startswith(b'Channel ') and data.rstrip().endswith(b'results'):
+                if not blocks:
+                    blocks.append(SamplingBlock(None, None))
+                channel = int(data.split()[1])
+                blocks[-1].lists[channel] = []
+    return blocks
+
+def read_timestamp_list(f, offset, chunk_size=CHUNK_SIZE):
+    """The number list starting at byte offset (just after its '[') of binary file f."""
+    f.seek(offset)
+    parts = []
+    for event, _, data in _scan(f, chunk_size, in_list=True):
+        if event in (_LIST_PART, _LIST_END):
+            parts.append(parse_ints(data, unsigned=True))
+        if event == _LIST_END:
+            break
+    return _concat(parts)
+
+def convert_sampling_file(filename, output, codec='delta-varint', chunk_size=CHUNK_SIZE):
+    """
+    Writes every trial of a sampling file into a binary timestamp file, one trial
+    at a time. Returns the number of trials written.
+    """
+    blocks = index_sampling_file(filename, chunk_size)
+    first, meta = 0, []
+    for b in blocks:
+        meta.append({'finished_at': b.finished_at, 'win_width': b.win_width,
+                     'first_trial': first, 'trials': b.trials})
+        first += b.trials
+    metadata = {'source': os.path.basename(filename), 'blocks': meta}
+    empty = parse_ints(b'', unsigned=True)
+    with open(filename, 'rb') as f, TimestampFileWriter(output, metadata, codec) as writer:
+        for b in blocks:
+            for trial in range(b.trials):
+                timestamps = [empty] * CHANNELS
+                for c, offsets in b.lists.items():
+                    if trial < len(offsets) and c < CHANNELS:
+                        timestamps[c] = read_timestamp_list(f, offsets[trial], chunk_size)
+                writer.add_trial(timestamps)
+    return first
@@ -0,0 +1,313 @@
+### BINARY TIMESTAMP FILES ######################
+# Usage: from commands.timestamp_file import *
+# Notes: compact container for per-trial, per-channel timestamps
+#################################################
+#
+# File layout (all integers little-endian):
+#
+#   header   magic b'QPXT' | u16 version | u16 codec | u32 meta_len
+#            | meta_len bytes of UTF-8 JSON run parameters | zero pad to 8
+#   trials   for every trial: a record header, magic b'QPXR' | u32 channels
+#            | for every channel: u64 count | u64 block bytes; then for every
+#            channel 0-15 the block of its timestamps in acquisition order,
+#            encoded with the file codec
+#   index    for every trial, for every channel: u64 offset | u64 count
+#            (offset is from the start of the file, count is in timestamps)
+#   footer   u64 index offset | u32 trials | magic b'QPXE'
+#
+# The index and footer are written by close(). A file cut short by a crash
+# has neither; the reader then rebuilds the index from the record headers
+# of the complete trials. Version 1 files have no record headers (a block
+# ends where the next one starts) and are still read.
+#
+# Codecs:
+#   0 raw           block of u64. Blocks stay 8-byte aligned, so the reader
+#                   hands out zero-copy views for any (trial, channel).
+#   1 delta-varint  differences to the previous timestamp of the block (the
+#                   first one to 0), zigzag mapped, as LEB128 varints
+#   2 delta-zlib    the same differences as u64, zlib compressed
+#
+# Consecutive hits on a channel are tens to thousands of 20 ns ticks apart, so
+# the delta codecs take 1-2 bytes per timestamp instead of 8.
+
+import sys
+import json
+import mmap
+import struct
+import zlib
+from array import array
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b'QPXT'
+END_MAGIC = b'QPXE'
+VERSION = 2
+CODEC_RAW = 0
+CODEC_DELTA_VARINT = 1
+CODEC_DELTA_ZLIB = 2
+CODECS = {'raw': CODEC_RAW, 'delta-varint': CODEC_DELTA_VARINT, 'delta-zlib': CODEC_DELTA_ZLIB}
+CHANNELS = 16
+MASK64 = (1 << 64) - 1
+
+RECORD_MAGIC = b'QPXR'
+
+_HEADER = struct.Struct('<4sHHI')
+_RECORD = struct.Struct('<4sI' + 'QQ' * CHANNELS)
+_FOOTER = struct.Struct('<QI4s')
+_INDEX_ENTRY = struct.Struct('<QQ')
+
+def _le_bytes(timestamps):
+    """Timestamps as little-endian u64 bytes, whatever sequence type they are."""
+    if not isinstance(timestamps, array) or timestamps.typecode != 'Q':
+        timestamps = array('Q', timestamps)
+    if sys.byteorder != 'little':
+        timestamps = array('Q', timestamps)
+        timestamps.byteswap()
+    return timestamps
+
+# --- DELTA CODECS ------------------------------
+# Each codec has a plain Python path and a vectorized NumPy path; both produce
+# identical bytes. Arithmetic is modulo 2**64, so out-of-order timestamps
+# (e.g. after a counter rollover) survive the round trip.
+
+def _deltas(timestamps):
+    prev = 0
+    for t in timestamps:
+        yield (t - prev) & MASK64
+        prev = t
+
+def _undelta(deltas):
+    return array('Q', accumulate(deltas, lambda a, b: (a + b) & MASK64))
+
+def encode_delta_varint(timestamps):
+    if np is not None:
+        return _encode_delta_varint_np(np.asarray(timestamps, dtype=np.uint64))
+    out = bytearray()
+    for d in _deltas(timestamps):
+        z = ((d << 1) ^ (MASK64 if d >> 63 else 0)) & MASK64 # zigzag
+        while z >= 0x80:
+            out.append((z & 0x7F) | 0x80)
+            z >>= 7
+        out.append(z)
+    return bytes(out)
+
+def decode_delta_varint(blob, count):
+    if np is not None:
+        return _decode_delta_varint_np(blob, count)
+    deltas = []
+    z = shift = 0
+    for b in blob:
+        z |= (b & 0x7F) << shift
+        shift += 7
+        if b < 0x80:
+            deltas.append((z >> 1) ^ (MASK64 if z & 1 else 0))
+            z = shift = 0
+    return _undelta(deltas)
+
+def encode_delta_zlib(timestamps):
+    if np is not None:
+        ts = np.asarray(timestamps, dtype=np.uint64)
+        deltas = np.diff(ts, prepend=np.uint64(0)).astype('<u8')
+        return zlib.compress(deltas.tobytes(), 1)
+    return zlib.compress(_le_bytes(array('Q', _deltas(timestamps))), 1)
+
+def decode_delta_zlib(blob, count):
+    raw = zlib.decompress(blob) if count else b''
+    if np is not None:
+        return np.cumsum(np.frombuffer(raw, dtype='<u8'), dtype=np.uint64)
+    deltas = array('Q', raw)
+    if sys.byteorder != 'little':
+        deltas.byteswap()
+    return _undelta(deltas)
+
+def _encode_delta_varint_np(ts):
+    d = np.diff(ts, prepend=np.uint64(0))
+    z = (d << np.uint64(1)) ^ (np.uint64(0) - (d >> np.uint64(63)))
+    # bytes needed per value: 1 + number of 7-bit groups above the first
+    lengths = np.ones(len(z), dtype=np.int64)
+    for k in range(1, 10):
+        lengths += (z >> np.uint64(7 * k)) > 0
+    starts = np.cumsum(lengths) - lengths
+    out = np.zeros(int(lengths.sum()), dtype=np.uint8)
+    for k in range(10):
+        sel = lengths > k
+        if not sel.any():
+            break
+        group = (z[sel] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (lengths[sel] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[sel] + k] = (group | more).astype(np.uint8)
+    return out.tobytes()
+
+def _decode_delta_varint_np(blob, count):
+    b = np.frombuffer(blob, dtype=np.uint8)
+    if count == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(b < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # position of every byte inside its varint
+    pos = np.arange(len(b)) - np.repeat(starts, ends - starts + 1)
+    groups = (b & 0x7F).astype(np.uint64) << (7 * pos).astype(np.uint64)
+    z = np.add.reduceat(groups, starts)
+    d = (z >> np.uint64(1)) ^ (np.uint64(0) - (z & np.uint64(1)))
+    return np.cumsum(d, dtype=np.uint64)
+
+_ENCODERS = {CODEC_DELTA_VARINT: encode_delta_varint, CODEC_DELTA_ZLIB: encode_delta_zlib}
+_DECODERS = {CODEC_DELTA_VARINT: decode_delta_varint, CODEC_DELTA_ZLIB: decode_delta_zlib}
+
+# -----------------------------------------------
+
+class TimestampFileWriter:
+    """Streams trials into a binary timestamp file; also usable as a run_pipelined() consumer."""
+    def __init__(self, filename, metadata=None, codec=CODEC_RAW):
+        self.filename = filename
+        self.codec = CODECS.get(codec, codec)
+        if self.codec not in (CODEC_RAW, CODEC_DELTA_VARINT, CODEC_DELTA_ZLIB):
+            raise ValueError(f'Unknown timestamp codec {codec!r}')
+        self._f = open(filename, 'wb')
+        self._index = []
+        meta = json.dumps(metadata or {}).encode()
+        header = _HEADER.pack(MAGIC, VERSION, self.codec, len(meta)) + meta
+        self._f.write(header + b'\0' * (-len(header) % 8))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __call__(self, trial, counts, timestamps):
+        self.add_trial(timestamps)
+
+    def add_trial(self, timestamps):
+        """
+        Appends one trial given as 16 per-channel timestamp sequences.
+        Returns (trial number in the file, offset of its record).
+        """
+        trial, offset = len(self._index) // CHANNELS, self._f.tell()
+        blocks = [self._encode(timestamps[c]) for c in range(CHANNELS)]
+        sizes = [memoryview(b).nbytes for b in blocks]
+        entries = [v for c in range(CHANNELS) for v in (len(timestamps[c]), sizes[c])]
+        self._f.write(_RECORD.pack(RECORD_MAGIC, CHANNELS, *entries))
+        for c in range(CHANNELS):
+            self._index.append((self._f.tell(), len(timestamps[c])))
+            self._f.write(blocks[c])
+        return trial, offset
+
+    def _encode(self, timestamps):
+        if self.codec == CODEC_RAW:
+            return _le_bytes(timestamps)
+        if len(timestamps):
+            return _ENCODERS[self.codec](timestamps)
+        return b''
+
+    def flush(self):
+        """Hands the trials written so far to the OS."""
+        self._f.flush()
+
+    def close(self):
+        if self._f.closed:
+            return
+        index_offset = self._f.tell()
+        for entry in self._index:
+            self._f.write(_INDEX_ENTRY.pack(*entry))
+        self._f.write(_FOOTER.pack(index_offset, len(self._index) // CHANNELS, END_MAGIC))
+        self._f.close()
+
+class TimestampFile:
+    """
+    Read-only view of a binary timestamp file. The file is memory-mapped, so
+    opening it costs only the header and index no matter how large it is.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.version, self.codec, meta_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{filename} is not a QPix timestamp file')
+        self.metadata = json.loads(self._mm[_HEADER.size:_HEADER.size+meta_len])
+
+        # blocks of version 2 files are followed by the next trial's record header
+        self._record_size = _RECORD.size if self.version >= 2 else 0
+        data_start = _HEADER.size + meta_len + (-(_HEADER.size + meta_len) % 8)
+        self.recovered = False
+        index_offset, trials, end_magic = _FOOTER.unpack_from(self._mm, len(self._mm) - _FOOTER.size)
+        if end_magic == END_MAGIC:
+            self._index = array('Q', self._mm[index_offset:index_offset + trials * CHANNELS * 16])
+            if sys.byteorder != 'little':
+                self._index.byteswap()
+        elif self.version >= 2:
+            self._index, trials, index_offset = self._scan_records(data_start)
+            self.recovered = True
+        else:
+            raise ValueError(f'{filename} is truncated (no index)')
+        self.trials = trials
+        self._index_offset = index_offset
+
+    def _scan_records(self, pos):
+        """Index of the complete trials from their record headers: (index, trials, end of the last trial)."""
+        index, trials, size = array('Q'), 0, len(self._mm)
+        while pos + _RECORD.size <= size:
+            magic, channels, *entries = _RECORD.unpack_from(self._mm, pos)
+            if magic != RECORD_MAGIC or channels != CHANNELS:
+                break
+            block = pos + _RECORD.size
+            if block + sum(entries[1::2]) > size:
+                break
+            for c in range(CHANNELS):
+                index.extend((block, entries[2 * c]))
+                block += entries[2 * c + 1]
+            pos = block
+            trials += 1
+        return index, trials, pos
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.trials
+
+    def close(self):
+        try:
+            self._mm.close()
+        except BufferError:
+            pass # a view from timestamps() is still alive; the map goes with it
+
+    def _entry(self, trial, c):
+        i = 2 * (trial * CHANNELS + c)
+        return self._index[i], self._index[i+1]
+
+    def count(self, trial, c):
+        return self._entry(trial, c)[1]
+
+    def counts(self):
+        """Per-trial channel counts, [trial][channel], as in sample_n_trials."""
+        return [[self.count(t, c) for c in range(CHANNELS)] for t in range(self.trials)]
+
+    def timestamps(self, trial, c):
+        """
+        One channel's timestamps in one trial: a NumPy uint64 array when NumPy
+        is available, otherwise a memoryview of 'Q' (raw) or array('Q').
+        Raw files return zero-copy views; delta codecs decode the block.
+        """
+        offset, count = self._entry(trial, c)
+        if self.codec != CODEC_RAW:
+            i = trial * CHANNELS + c + 1
+            if i == self.trials * CHANNELS:
+                end = self._index_offset
+            elif c == CHANNELS - 1:
+                end = self._index[2 * i] - self._record_size
+            else:
+                end = self._index[2 * i]
+            return _DECODERS[self.codec](self._mm[offset:end], count)
+        if np is not None:
+            return np.frombuffer(self._mm, dtype='<u8', count=count, offset=offset)
+        return memoryview(self._mm)[offset:offset + 8 * count].cast('Q')
@@ -0,0 +1,151 @@
+### TRIAL TIMING ################################
+# Usage: profiler = TrialProfiler()
+#        sample_n_trials(..., profiler=profiler); profiler.write_json(...)
+# Notes: per-phase timers and register counters for iter_trials()
+#################################################
+
+import sys
+import json
+import time
+from commands.helper_functions import set_backend, get_backend
+
+PHASES = ('configure', 'arm', 'drain', 'reset', 'print', 'write')
+
+class CountingBackend:
+    """Register backend wrapper counting every peek (read) and poke (write)."""
+    def __init__(self, mem):
+        self.mem = mem
+        self.reads = 0
+        self.writes = 0
+
+    def __len__(self):
+        return len(self.mem)
+
+    def __getitem__(self, key):
+        self.reads += 1
+        return self.mem[key]
+
+    def __setitem__(self, key, value):
+        self.writes += 1
+        self.mem[key] = value
+
+class TimedStream:
+    """stdout wrapper adding the time spent in every write to profiler.printed."""
+    def __init__(self, stream, profiler):
+        self.stream = stream
+        self.profiler = profiler
+
+    def write(self, text):
+        start = time.perf_counter()
+        n = self.stream.write(text)
+        self.profiler.printed += time.perf_counter() - start
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+class TrialProfiler:
+    """
+    Splits every trial of iter_trials() into configure/arm/drain/reset/print/write
+    phases and counts register traffic; one record per trial in self.records.
+    """
+    def __init__(self):
+        self.records = []
+        self._backend = None
+        self._last = 0.0
+        self._record = None
+        self._pending_configure = self._pending_print = 0.0
+        self._reads = self._writes = 0
+        self._stdout = None
+        self.printed = 0.0 # stdout time not yet booked to 'print'
+
+    # --- run and trial boundaries -----------------
+
+    def begin_run(self):
+        """Starts counting register traffic and timing the configure phase."""
+        self._backend = CountingBackend(get_backend())
+        set_backend(self._backend)
+        # console output is booked to 'print' in whichever phase it happens
+        self._stdout = sys.stdout
+        sys.stdout = TimedStream(sys.stdout, self)
+        self.printed = 0.0
+        self._last = time.perf_counter()
+
+    def end_run(self):
+        if self._backend is not None:
+            set_backend(self._backend.mem)
+            self._backend = None
+        if self._stdout is not None:
+            sys.stdout = self._stdout
+            self._stdout = None
+
+    def end_configure(self):
+        now = time.perf_counter()
+        self._pending_configure = now - self._last - self.printed
+        self._pending_print, self.printed = self.printed, 0.0
+        self._last = now
+
+    def start_trial(self, trial):
+        self.mark('write') # consumer time of the previous trial
+        self._record = {'trial': trial, 'phases': dict.fromkeys(PHASES, 0.0),
+                        'drain_per_channel': [0.0] * 16, 'words': [0] * 16,
+                        'reg_reads': 0, 'reg_writes': 0}
+        self._record['phases']['configure'] = self._pending_configure
+        self._record['phases']['print'] = self._pending_print
+        self._pending_configure = self._pending_print = 0.0
+        self._reads, self._writes = self._backend.reads, self._backend.writes
+        self.records.append(self._record)
+
+    def end_drain(self, counts):
+        self.mark('drain')
+        self._record['words'] = list(counts)
+
+    def end_trial(self):
+        self.mark('write')
+        self._record['reg_reads'] = self._backend.reads - self._reads
+        self._record['reg_writes'] = self._backend.writes - self._writes
+
+    # --- timers -----------------------------------
+
+    def mark(self, phase):
+        """Books the time since the previous mark to phase of the current trial."""
+        now = time.perf_counter()
+        if self._record is not None:
+            self._record['phases'][phase] += now - self._last - self.printed
+            self._record['phases']['print'] += self.printed
+        self.printed = 0.0
+        self._last = now
+
+    def mark_channel(self, c):
+        """Books the time since the previous mark to channel c's drain."""
+        now = time.perf_counter()
+        elapsed = now - self._last - self.printed
+        self._record['phases']['drain'] += elapsed
+        self._record['phases']['print'] += self.printed
+        self._record['drain_per_channel'][c] += elapsed
+        self.printed = 0.0
+        self._last = now
+
+    # --- export -----------------------------------
+
+    def summary(self):
+        """Totals over all recorded trials."""
+        total = {'trials': len(self.records), 'phases': dict.fromkeys(PHASES, 0.0),
+                 'words': 0, 'reg_reads': 0, 'reg_writes': 0}
+        for r in self.records:
+            for phase, t in r['phases'].items():
+                total['phases'][phase] += t
+            total['words'] += sum(r['words'])
+            total['reg_reads'] += r['reg_reads']
+            total['reg_writes'] += r['reg_writes']
+        return total
+
+    def format_record(self, r):
+        """One-line form of a trial record, e.g. for deltaT_log.txt."""
+        phases = ', '.join(f'{p} {t:.6f}' for p, t in r['phases'].items())
+        return (f"Trial {r['trial']} phases (s): {phases}; words {sum(r['words'])}, "
+                f"reads {r['reg_reads']}, writes {r['reg_writes']}")
+
+    def write_json(self, filename):
+        with open(filename, 'w') as f:
+            json.dump({'summary': self.summary(), 'trials': self.records}, f, indent=1)
@@ -0,0 +1,161 @@
+### VSET SEARCH #################################
+# Usage: from commands.vset_search import *
+# Notes: searches the DAC7578 VSET of several channels at once; every
+#        sampling trial is shared by all channels still searching
+#        (BisectionSearch, or ModelSearch for model-guided steps)
+#################################################
+
+import time
+
+class BisectionSearch:
+    """
+    Per-channel bisection for the VSET giving target ± tolerance reset counts,
+    with every measurement shared by all channels still searching.
+    """
+    def __init__(self, channels, min_v, max_v, target=10, tolerance=2,
+                 voltage_tolerance=0.0001, max_iterations=100,
+                 zero_count_threshold=10, channel_offset=8):
+        self.target = target
+        self.tolerance = tolerance
+        self.voltage_tolerance = voltage_tolerance
+        self.max_iterations = max_iterations
+        self.zero_count_threshold = zero_count_threshold
+        self.channel_offset = channel_offset
+        self.brackets = {c: [min_v, max_v] for c in channels}
+        self.end_counts = {c: [None, None] for c in channels} # counts measured at the bracket ends
+        self.best = {c: (float('inf'), None) for c in channels} # (|count - target|, v)
+        self.zero_streak = dict.fromkeys(channels, 0)
+        self.active = list(channels)
+        self.history = {c: [] for c in channels} # (v, count) per measurement
+        self.results = {} # channel -> v_set, or None
+        self.status = {}  # channel -> why the search stopped
+        self.iterations = 0
+        self._probes = {}
+
+    def done(self):
+        return not self.active
+
+    def _stop(self, c, status, v=None):
+        if status != 'found':
+            diff, v = self.best[c]
+            if v is None:
+                print(f"Channel {c + self.channel_offset}: No v_set found ({status})")
+            else:
+                print(f"Channel {c + self.channel_offset}: Best v_set found at {v:.6f}V (diff: {diff:.2f})")
+        else:
+            print(f"Channel {c + self.channel_offset}: Found optimal v_set at {v:.6f}V")
+        self.results[c] = v
+        self.status[c] = status
+        self.active.remove(c)
+
+    def propose(self):
+        """{channel: v_set} to measure next, one entry per active channel."""
+        for c in list(self.active):
+            lo, hi = self.brackets[c]
+            if hi - lo <= self.voltage_tolerance:
+                self._stop(c, 'resolution')
+            elif self.iterations >= self.max_iterations:
+                self._stop(c, 'iterations')
+        self._probes = {c: self._next_probe(c) for c in self.active}
+        return dict(self._probes)
+
+    def _next_probe(self, c):
+        return sum(self.brackets[c]) / 2
+
+    def update(self, counts):
+        """
+        Narrows every probed bracket from one measurement, counts[c] being
+        the reset count of DAC channel c (missing channels count as 0). A
+        failed measurement (None) still uses up an iteration.
+        """
+        self.iterations += 1
+        if counts is None:
+            return
+        for c, v in self._probes.items():
+            count = counts.get(c, 0)
+            self.history[c].append((v, count))
+            diff = abs(count - self.target)
+            if diff < self.best[c][0]:
+                self.best[c] = (diff, v)
+
+            if count == 0:
+                self.zero_streak[c] += 1
+                if self.zero_streak[c] >= self.zero_count_threshold:
+                    print(f"Channel {c + self.channel_offset}: Too many zero counts, stopping search")
+                    self._stop(c, 'zero')
+                else:
+                    self.brackets[c][1] = v # search lower voltages
+                    self.end_counts[c][1] = None
+                continue
+            self.zero_streak[c] = 0
+
+            if count < self.target - self.tolerance:
+                self.brackets[c][0] = v # need higher voltage
+                self.end_counts[c][0] = count
+            elif count > self.target + self.tolerance:
+                self.brackets[c][1] = v # need lower voltage
+                self.end_counts[c][1] = count
+            else:
+                self._stop(c, 'found', v)
+        self._probes = {}
+
+class ModelSearch(BisectionSearch):
+    """
+    BisectionSearch that probes the VSET predicted by interpolation or a line fit,
+    falling back to the midpoint when the prediction is unusable.
+    """
+    def __init__(self, channels, min_v, max_v, fit_points=4, min_r2=0.8,
+                 edge_fraction=0.05, **kwargs):
+        super().__init__(channels, min_v, max_v, **kwargs)
+        self.fit_points = fit_points
+        self.min_r2 = min_r2
+        self.edge_fraction = edge_fraction
+        self.model_steps = 0
+        self._model_width = {} # channel -> bracket width before its last model step
+
+    def _interpolate(self, c):
+        (lo, hi), (n_lo, n_hi) = self.brackets[c], self.end_counts[c]
+        if n_lo is None or n_hi is None or n_hi <= n_lo:
+            return None
+        return lo + (self.target - n_lo) * (hi - lo) / (n_hi - n_lo)
+
+    def _fit(self, c):
+        points = [(v, n) for v, n in self.history[c] if n > 0][-self.fit_points:]
+        if len(points) < 2:
+            return None
+        k = len(points)
+        mv = sum(v for v, _ in points) / k
+        mn = sum(n for _, n in points) / k
+        svv = sum((v - mv) ** 2 for v, _ in points)
+        svn = sum((v - mv) * (n - mn) for v, n in points)
+        snn = sum((n - mn) ** 2 for _, n in points)
+        if svv == 0 or svn <= 0 or svn * svn < self.min_r2 * svv * snn:
+            return None
+        return mv + (self.target - mn) * svv / svn
+
+    def _next_probe(self, c):
+        lo, hi = self.brackets[c]
+        width = hi - lo
+        previous = self._model_width.pop(c, None)
+        if previous is not None and width > previous / 2:
+            return (lo + hi) / 2
+        v = self._interpolate(c)
+        if v is None:
+            v = self._fit(c)
+        margin = self.edge_fraction * width
+        if v is None or not lo + margin < v < hi - margin:
+            return (lo + hi) / 2
+        self._model_width[c] = width
+        self.model_steps += 1
+        return v
+
+def run_search(search, set_vsets, measure, settle=0.05):
+    """Runs search to the end with set_vsets({channel: v}) and measure() -> {channel: count}."""
+    while not search.done():
+        vsets = search.propose()
+        if not vsets:
+            break
+        set_vsets(vsets)
+        time.sleep(settle)
+        search.update(measure())
+    return search.results
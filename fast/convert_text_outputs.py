@@ -0,0 +1,48 @@
+### TEXT OUTPUT CONVERSION SCRIPT #############################
+# Usage: python3 convert_text_outputs.py [paths ...] [--codec delta-varint] [--force]
+# Notes: converts run_sampling.py text files (default: every one in the
+#        outputs* directories) into binary timestamp files next to them
+###############################################################
+
+import os
+import sys
+import glob
+import time
+import argparse
+from commands.text_outputs import is_sampling_file, convert_sampling_file
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert QPix sampling text files to binary timestamp files")
+    parser.add_argument('paths', nargs='*', help="Sampling files or directories (default: every outputs* directory)")
+    parser.add_argument('--codec', choices=['raw', 'delta-varint', 'delta-zlib'], default='delta-varint',
+                        help="Timestamp encoding (default: delta-varint)")
+    parser.add_argument('--force', action='store_true', help="Convert again even if the .qpxt file is newer")
+    return parser.parse_args()
+
+def sampling_files(paths):
+    for path in paths:
+        names = [path] if os.path.isfile(path) else sorted(glob.glob(os.path.join(path, '*.txt')))
+        for name in names:
+            if is_sampling_file(name):
+                yield name
+
+def main():
+    args = parse_args()
+    paths = args.paths or sorted(d for d in glob.glob('outputs*') if os.path.isdir(d))
+    total_bytes, start = 0, time.perf_counter()
+    for name in sampling_files(paths):
+        output = os.path.splitext(name)[0] + '.qpxt'
+        if not args.force and os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(name):
+            print(f'{name}: up to date')
+            continue
+        trials = convert_sampling_file(name, output, args.codec)
+        size = os.path.getsize(name)
+        total_bytes += size
+        print(f'{name}: {trials} trial(s) -> {output} ({os.path.getsize(output)} of {size} bytes)')
+    elapsed = time.perf_counter() - start
+    if total_bytes:
+        print(f'\nConverted {total_bytes/1e6:.1f} MB in {elapsed:.2f} s ({total_bytes/1e6/elapsed:.0f} MB/s)')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
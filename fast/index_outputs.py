@@ -0,0 +1,54 @@
+### RESULTS INDEX SCRIPT ######################################
+# Usage: python3 index_outputs.py [dirs ...] [--db outputs_index.sqlite]
+#        python3 index_outputs.py --channel 12 [--month 2] [--runs 'outputs_feb%']
+# Notes: (re)indexes the outputs* directories into a SQLite catalog, then
+#        optionally compares one channel's calibration across runs
+###############################################################
+
+import sys
+import argparse
+from commands.results_index import *
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Index QPix output directories into a SQLite catalog")
+    parser.add_argument('dirs', nargs='*', help="Output directories to index (default: every outputs* directory)")
+    parser.add_argument('--db', type=str, default='outputs_index.sqlite', help="Catalog file (default: outputs_index.sqlite)")
+    parser.add_argument('--no_scan', action='store_true', help="Query the catalog as it is, without rescanning")
+    parser.add_argument('--channel', type=int, default=None, help="Compare this channel's calibration across runs")
+    parser.add_argument('--month', type=int, default=None, help="Only runs from this month (1-12)")
+    parser.add_argument('--runs', type=str, default=None, help="Only runs whose directory matches this SQL LIKE pattern")
+    return parser.parse_args()
+
+def print_comparison(rows):
+    """DAC settings down, one column of mean counts per calibration file."""
+    columns, means = [], {}
+    for directory, date, sample_select, delta_t, cal_pulse, path, dac, n, mean, std in rows:
+        if path not in means:
+            columns.append((path, date, sample_select, delta_t, cal_pulse))
+            means[path] = {}
+        means[path][dac] = mean
+    for k, (path, date, sample_select, delta_t, cal_pulse) in enumerate(columns):
+        print(f'[{k}] {path}  date={date} sample_select={sample_select} delta_t={delta_t} cal_pulse={cal_pulse}')
+    print('\nDAC  ' + ''.join(f'{f"[{k}]":>9}' for k in range(len(columns))))
+    for dac in sorted({dac for m in means.values() for dac in m}):
+        cells = (means[path].get(dac) for path, *_ in columns)
+        print(f'{dac:<5}' + ''.join(f'{m:>9.2f}' if m is not None else f'{"-":>9}' for m in cells))
+
+def main():
+    args = parse_args()
+    conn = open_index(args.db)
+    if not args.no_scan:
+        for directory, parsed in index_outputs(conn, args.dirs or None).items():
+            print(f'{directory}: {parsed} file(s) parsed')
+    if args.channel is not None:
+        rows = channel_history(conn, args.channel, args.month, args.runs)
+        if not rows:
+            print(f'No calibration data for channel {args.channel}')
+            return 1
+        print()
+        print_comparison(rows)
+    conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
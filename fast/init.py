@@ -8,6 +8,8 @@ import os
 import sys
 import time
 from commands.helper_functions import *
+from commands.serial_interface import send_serial_commands, invalidate_serial_cache
+from commands.i2c_dacs import set_dac10, dac7578_counts, set_dac7578_channels
 
 ### USER INPUTS ###
 rst_cal_gap = 100e-9
@@ -18,23 +20,25 @@ vcomp2_threshold = 0.9
 ###################
 
 print('Running the Magic Sequence: ')
+# The chip was just powered up: a shadow left by an earlier process is stale
+invalidate_serial_cache()
 # Set calibration widths
 set_rst_cal_gap(rst_cal_gap)
 set_reset_width(reset_width)
 # SET DAC THRESHOLDS
-os.system(f'python3 commands/set_DACs.py TP 2 {str(tp_threshold)}')
-os.system(f'python3 commands/set_DACs.py VCOMP 1 {str(vcomp1_threshold)}')
-os.system(f'python3 commands/set_DACs.py VCOMP 2 {str(vcomp2_threshold)}')
+set_dac10('TP', 2, tp_threshold)
+set_dac10('VCOMP', 1, vcomp1_threshold)
+set_dac10('VCOMP', 2, vcomp2_threshold)
 
 
 # ---- Testing VCM2 controls due to 10k and 5k resistors - SRAK
-os.system('python3 old_files/set_DAC7578_ncd.py')
-os.system('python3 old_files/set_DAC2.py')
+set_dac7578_channels(dac7578_counts(0.8, 1.007), addr=0x48) # old_files/set_DAC7578_ncd.py
+set_dac7578_channels(dac7578_counts(0.75, 1.137), addr=0x49) # old_files/set_DAC2.py
 # ----
 
 # Calibration mode, DBL_bar, ring osc on, one channel enabled
-os.system('python3 commands/serial_interface.py  1  0x55B680CE')
-os.system('python3 commands/serial_interface.py  2  0x55B680CE')
+# (both interfaces are shifted at the same time)
+send_serial_commands({1: 0x55B680CE, 2: 0x55B680CE})
 
 os.system('python3 commands/integrator_rst.py 1')
 os.system('python3 commands/integrator_rst.py 2')
@@ -42,8 +46,7 @@ os.system('python3 commands/integrator_rst.py 2')
 calibration_pulse()
 
 # Calibration mode, ring osc on slow, ALL channel enabled (decimal 17)
-os.system('python3 commands/serial_interface.py  1  0x55B6FFC4')
-os.system('python3 commands/serial_interface.py  2  0x55B6FFC4')
+send_serial_commands({1: 0x55B6FFC4, 2: 0x55B6FFC4})
 
 startup()
 set_ext_clock(1)
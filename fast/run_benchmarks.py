@@ -0,0 +1,228 @@
+### ACQUISITION BENCHMARKS ####################################
+# Usage: python3 run_benchmarks.py [--backend sim|mem] [--save_baseline]
+# Notes: measures the register/drain hot path and compares it with a
+#        stored baseline; exits with status 1 on a regression
+###############################################################
+
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import contextlib
+import statistics as stats
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="QPix acquisition benchmarks")
+    parser.add_argument('--backend', choices=['sim', 'mem'], default='sim',
+                        help="Simulated register file or the real /dev/mem mapping (default: sim)")
+    parser.add_argument('--reps', type=int, default=5, help="Repetitions per measurement")
+    parser.add_argument('--reg_ops', type=int, default=100000, help="peek/poke calls per repetition")
+    parser.add_argument('--win_widths', type=float, nargs='+', default=[10e-6, 100e-6, 1e-3, 10e-3],
+                        help="Window widths used to vary FIFO occupancy")
+    parser.add_argument('--dac_setting', type=int, default=20, help="DAC setting for the calibration step")
+    parser.add_argument('--skip_dac_step', action='store_true',
+                        help="Skip the calibration DAC step (it includes the serial programming sleeps)")
+    parser.add_argument('--serial_clock_hz', type=float, default=1e6,
+                        help="Gated shift clock used for the fast serial timing profile (default: 1e6)")
+    parser.add_argument('--skip_serial', action='store_true', help="Skip the serial programming benchmark")
+    parser.add_argument('--output', type=str, default=None,
+                        help="Results file (default: benchmarks/results_<backend>.json)")
+    parser.add_argument('--baseline', type=str, default=None,
+                        help="Baseline file (default: benchmarks/baseline_<backend>.json)")
+    parser.add_argument('--save_baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed relative slowdown before a metric counts as a regression (default: 0.2)")
+    return parser.parse_args()
+
+args = parse_args()
+if args.backend == 'sim':
+    os.environ['QPIX_BACKEND'] = 'sim'
+
+from commands.helper_functions import *
+from commands.sampling_functions import *
+from commands.serial_interface import *
+from commands.config_word import ConfigWord, dac_command
+from commands.i2c_dacs import dac7578_counts, set_dac7578_channels
+
+# metric name -> value, unit and direction (higher_is_better=None: informational only)
+results = {}
+
+def record(name, value, unit, higher_is_better):
+    results[name] = {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+    print(f'{name:<45} {value:>14.6g} {unit}')
+
+def best_of(fn, reps):
+    """Shortest wall time of fn() over reps runs, plus the last return value."""
+    times = []
+    for _ in range(reps):
+        start = time.perf_counter()
+        ret = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), ret
+
+_devnull = open(os.devnull, 'w')
+
+def quiet():
+    """Sends the helpers' console chatter to /dev/null (it is still formatted)."""
+    return contextlib.redirect_stdout(_devnull)
+
+def arm_window(win_width):
+    """One sampling window with the sequence deasserted again, FIFOs left full."""
+    with quiet():
+        set_win_width(win_width)
+        startup()
+        set_ext_clock(1)
+        sample_pulse()
+
+def bench_register_ops():
+    n = args.reg_ops
+    scratch = 0x43c0001c # window width register, written back unchanged
+    value = peek(scratch)
+    t, _ = best_of(lambda: [peek(scratch) for _ in range(n)], args.reps)
+    record('peek_ops_per_s', n / t, 'ops/s', True)
+    t, _ = best_of(lambda: [poke(scratch, value) for _ in range(n)], args.reps)
+    record('poke_ops_per_s', n / t, 'ops/s', True)
+    t, _ = best_of(lambda: [read_status_block() for _ in range(n)], args.reps)
+    record('status_snapshot_per_s', n / t, 'ops/s', True)
+
+def bench_channel_drain(win_width):
+    """Words drained per second from one channel at a time."""
+    channels = get_channels_in_use()
+    for c in channels:
+        rates = []
+        for _ in range(args.reps):
+            arm_window(win_width)
+            start = time.perf_counter()
+            count, _ = sample_channel(c)
+            elapsed = time.perf_counter() - start
+            sample_working_channels() # empty the other channels
+            if count:
+                rates.append(count / elapsed)
+        if rates:
+            record(f'drain_words_per_s_ch{c}', max(rates), 'words/s', True)
+
+def bench_trial_drain():
+    """Whole-trial drain latency against FIFO occupancy, for both drain modes."""
+    for mode, drain in (('seq', sample_working_channels), ('par', sample_channels_parallel)):
+        for win_width in args.win_widths:
+            latencies, words = [], []
+            for _ in range(args.reps):
+                arm_window(win_width)
+                start = time.perf_counter()
+                counts, _ = drain()
+                latencies.append(time.perf_counter() - start)
+                words.append(sum(counts))
+            occupancy = stats.mean(words)
+            record(f'trial_drain_{mode}_words_win{win_width:g}', occupancy, 'words', None)
+            record(f'trial_drain_{mode}_latency_s_win{win_width:g}', min(latencies), 's', False)
+            if occupancy:
+                record(f'trial_drain_{mode}_s_per_word_win{win_width:g}', min(latencies) / occupancy, 's/word', False)
+    with quiet():
+        startup()
+
+def bench_dac_step():
+    """One run_calibration_mmap_args DAC step: program interface 1, then sample one trial."""
+    base_config = ConfigWord.from_file('configs/calibration.cfg')
+    def step():
+        send_serial_command(1, dac_command(base_config, args.dac_setting), force=True)
+        return [counts for _, counts, _ in iter_trials(1, win_width=100e-6, win_wait=5e-6,
+                                                       reset_width=5e-6, sampling=True)]
+    with quiet():
+        t, _ = best_of(step, min(args.reps, 2))
+    record('calibration_dac_step_s', t, 's', False)
+
+def bench_serial_programming():
+    """
+    Serial word latency for the legacy and clock-derived timings. The sim latch
+    check uses the same assumed clock, so it only checks the arithmetic.
+    """
+    sim = get_backend() if args.backend == 'sim' else None
+    if sim:
+        sim.serial_clock_hz = args.serial_clock_hz
+    words = [0x55B680CE, 0x55B6FFC4, 0x5B5680CE]
+    profiles = [('legacy', LEGACY_TIMING, False),
+                ('fast', SerialTiming.from_clock(args.serial_clock_hz), False),
+                ('no_hold', SerialTiming(0, 0, 0, 0, 0), True)]
+    for name, timing, informational in profiles:
+        latched = 0
+        start = time.perf_counter()
+        for word in words:
+            send_serial_command(1, word, timing, force=True)
+            if sim and sim.qpix_config[1] == word:
+                latched += 1
+        elapsed = time.perf_counter() - start
+        if not informational:
+            record(f'serial_word_latency_s_{name}', elapsed / len(words), 's', False)
+        if sim:
+            record(f'serial_words_latched_sim_{name}', latched / len(words), 'fraction', None)
+
+def bench_dac_update():
+    """Time to set the 8 DAC7578 channels by broadcast and by staged writes (sim only)."""
+    counts = dac7578_counts(0.8, 1.007)
+    per_channel = {c: counts + c for c in range(8)}
+    n = 1000
+    t, _ = best_of(lambda: [set_dac7578_channels(counts) for _ in range(n)], args.reps)
+    record('dac7578_8ch_broadcast_s', t / n, 's', False)
+    t, _ = best_of(lambda: [set_dac7578_channels(per_channel) for _ in range(n)], args.reps)
+    record('dac7578_8ch_staged_s', t / n, 's', False)
+
+def compare(baseline):
+    regressions = []
+    for name, new in results.items():
+        old = baseline.get('results', {}).get(name)
+        if old is None or not old['value'] or new['higher_is_better'] is None:
+            continue
+        ratio = new['value'] / old['value']
+        change = ratio - 1 if new['higher_is_better'] else 1 / ratio - 1
+        flag = ''
+        if change < -args.tolerance:
+            regressions.append(name)
+            flag = '  <-- REGRESSION'
+        print(f'{name:<45} {change:+8.1%}{flag}')
+    return regressions
+
+def main():
+    os.makedirs('benchmarks', exist_ok=True)
+    output = args.output or f'benchmarks/results_{args.backend}.json'
+    baseline_file = args.baseline or f'benchmarks/baseline_{args.backend}.json'
+
+    print(f'Benchmarking on the {args.backend} backend...\n')
+    bench_register_ops()
+    bench_channel_drain(args.win_widths[-1])
+    bench_trial_drain()
+    if not args.skip_serial:
+        bench_serial_programming()
+    if args.backend == 'sim':
+        bench_dac_update()
+    if not args.skip_dac_step:
+        bench_dac_step()
+
+    report = {'date': str(datetime.datetime.now()), 'backend': args.backend,
+              'python': sys.version.split()[0], 'results': results}
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResults written to {output}')
+
+    if args.save_baseline:
+        with open(baseline_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Baseline written to {baseline_file}')
+        return 0
+    if not os.path.exists(baseline_file):
+        print(f'No baseline at {baseline_file}; run with --save_baseline to create one.')
+        return 0
+
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    print(f'\nChange against baseline from {baseline["date"]}:')
+    regressions = compare(baseline)
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}.')
+        return 1
+    print('\nNo regressions.')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,12 +4,7 @@
 # Notes: can run for a range of DAC settings OR one DAC setting
 ###############################################################
 
-import sys
-import os
-import time
-from commands.sampling_functions import *
-from commands.helper_functions import *
-import statistics as stats
+from commands.calibration import *
 
 ### USER INPUTS ###
 DAC_settings = range(12 , 32 , 1) 
@@ -25,65 +20,10 @@ config_file = 'configs/calibration.cfg'
 external_clock = True
 ###################
 
-if external_clock: set_ext_clock(1)
-else: set_ext_clock(0)
-
-set_sample_select(1)
-
-
-def make_five(dacNum):
-    if len(dacNum) < 5:
-        dacNum = '0' + dacNum
-        return make_five(dacNum)
-    else:
-        return str(dacNum)
-
-def make_hex_command(DAC_setting): 
-    #take integer setting, make a hex command that overwrites the first four entries in calibration.cfg
-    default_settings_bin = read_config_file(config_file)
-    DAC_setting_bin = bin(DAC_setting)[2:]
-    DAC_setting_bin = make_five(DAC_setting_bin)
-    replCur0 = DAC_setting_bin[4]
-    replCur1_4 = DAC_setting_bin[:4][::-1]
-    final_setting_bin = replCur1_4 + default_settings_bin[4:24] + replCur0 + default_settings_bin[25:]
-    final_setting = int(final_setting_bin, 2)
-    hex_command = f'0x{final_setting:08X}'
-    return hex_command
-
-for c in range(7):
-    fname = f'outputs/ch{c}_calib.txt'
-    if os.path.exists(fname):
-        os.remove(fname)
-        print(f'Deleted old file: {fname}')
-
-
-print("Running Calibration...")
-i = 0
-set_delta_t(delta_t)
-with open('deltaT_log.txt', 'a') as file_writer:
-    for DAC_setting in DAC_settings:
-        i += 1
-        hex_command = make_hex_command(DAC_setting)
-        print(f'*** DAC setting: {str(DAC_setting)}, ({i} out of {len(DAC_settings)}) ***')
-        os.system('python3 commands/serial_interface.py ' + str(interface) + ' "' + hex_command + '" ') 
-        file_writer.write(f"\n-- DAC setting: {DAC_setting} ---\n")
-        #all_counts, all_timestamps = sample_n_trials(trials_num, win_width=win_width, win_wait=win_wait, reset_width=reset_width, rst_cal_gap = rst_cal_gap, external_clock=external_clock, sampling=True)
-        all_counts, all_timestamps = sample_n_trials(trials_num, win_width=win_width, win_wait=win_wait, reset_width = reset_width, rst_cal_gap=rst_cal_gap, external_clock=external_clock, sampling=True, cal_pulse=False, file_writer=file_writer)
-        #ORIGINAL sample_n_trials function
-        #all_counts, all_timestamps = sample_n_trials(trials_num, win_width=win_width, win_wait=win_wait, reset_width = reset_width, rst_cal_gap=rst_cal_gap, cal_pulse=True, external_clock=external_clock, file_writer=file_writer)
-        print()
-        for c in range(7):
-            fname = f'outputs/ch{c}_calib.txt'
-            with open(fname, 'a') as f:
-                counts = [counts[c] for counts in all_counts]
-                f.write(f'DAC setting: {DAC_setting}\n')
-                f.write(f'Counts: {counts}\n')
-                f.write(f'Mean: {sum(counts)/len(counts):.2f}\n')
-                #f.write(f'Stdev: {stats.stdev(counts):.2f}\n')
-                if c in get_channels_in_use():
-                    print(f'Channel {c} results:')
-                    print(f'Counts: {[counts[c] for counts in all_counts]}')
-                    print(f'Mean: {sum(counts)/len(counts):.2f}')
-                    #print(f'Stdev: {stats.stdev(counts):.2f}')
-        print("#"*10)
-        print()
+# in-process calibration engine, DAC bit 0 -> replenCur0, bits 1-4 -> replCur1-4
+plan = CalibrationPlan(DAC_settings, trials_num, interfaces=[interface], channels=range(7),
+                       bit_order='legacy', config_file=config_file, win_width=win_width,
+                       win_wait=win_wait, reset_width=reset_width, rst_cal_gap=rst_cal_gap,
+                       external_clock=external_clock, sample_select=1, delta_t=delta_t,
+                       sampling=True, cal_pulse=False)
+run_calibration(plan, [CalibTextSink(), ConsoleSink()])
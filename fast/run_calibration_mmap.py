@@ -4,13 +4,8 @@
 # Notes: can run for a range of DAC settings OR one DAC setting
 ###############################################################
 
-import sys
-import os
-import time
 import argparse
-from commands.sampling_functions import *
-from commands.helper_functions import *
-from commands.serial_interface import send_serial_command
+from commands.calibration import *
 
 def parse_args():
     parser = argparse.ArgumentParser(description="QPix FPGA Calibration Script (mmap optimized)")
@@ -50,87 +45,24 @@ def parse_args():
 
     return parser.parse_args()
 
-def make_hex_command_fast(DAC_val, base_config):
-    """Replaces make_five and string slicing with efficient formatting."""
-    dac_bits = f"{DAC_val & 0x1F:05b}"
-    replCur0 = dac_bits[4]
-    replCur1_4 = dac_bits[:4][::-1]
-    final_bin = replCur1_4 + base_config[4:24] + replCur0 + base_config[25:]
-    return int(final_bin, 2)
-
 def main():
     args = parse_args()
-    sampling_bool = (args.sampling == 'True')
-    cal_pulse_bool = (args.cal_pulse == 'True')
-    
-    # Generate the range object from arguments
-    DAC_settings = range(args.dac_range[0], args.dac_range[1], args.dac_range[2])
+
     # Range of channels depending on the interface
     interface_ranges = {
         1: range(8),
         2: range(8, 16)
     }
-    channel_range = interface_ranges.get(args.interface, range(0))
-
-    # --- PRE-LOOP OPTIMIZATIONS ---
-    default_config_bin = read_config_file(args.config_file)
-    working_channels = get_channels_in_use()
-
-    # Clean and open output files
-    out_files = {}
-    for c in channel_range:
-        fname = f'outputs/ch{c}_calib.txt'
-        if os.path.exists(fname):
-            os.remove(fname)
-        out_files[c] = open(fname, 'a')
-
-    try:
-        set_ext_clock(1 if args.external_clock else 0)
-        set_sample_select(args.sample_select)
-        set_delta_t(args.delta_t)
-
-        print(f"Running Calibration on interface {args.interface}...")
-        
-        with open('deltaT_log.txt', 'a') as delta_log:
-            for i, DAC_setting in enumerate(DAC_settings, 1):
-                
-                cmd_int = make_hex_command_fast(DAC_setting, default_config_bin)
-                print(f'*** DAC setting: {DAC_setting}, ({i} out of {len(DAC_settings)}) ***')
-
-                # CALL DIRECTLY: No new Python process spawned
-                send_serial_command(args.interface, cmd_int)
-
-                delta_log.write(f"\n-- DAC setting: {DAC_setting} ---\n")
-
-                # Sampling logic using arguments
-                all_counts, all_timestamps = sample_n_trials(
-                    args.trials_num, 
-                    win_width=args.win_width, 
-                    win_wait=args.win_wait,
-                    reset_width=args.reset_width, 
-                    rst_cal_gap=args.rst_cal_gap,
-                    external_clock=args.external_clock, 
-                    sampling=sampling_bool,
-                    cal_pulse=cal_pulse_bool, 
-                    file_writer=delta_log
-                )
-
-                # Output Processing
-                for c in channel_range:
-                    counts = [trial[c] for trial in all_counts]
-                    mean_val = sum(counts)/len(counts) if counts else 0
-
-                    f = out_files[c]
-                    f.write(f'DAC setting: {DAC_setting}\nCounts: {counts}\nMean: {mean_val:.2f}\n')
-
-                    if c in working_channels:
-                        print(f'Channel {c} counts: {counts}, Mean: {mean_val:.2f}')
-                print("#"*10 + "\n")
 
-    finally:
-        for f in out_files.values():
-            f.close()
-        print("Calibration complete. Files closed.")
+    plan = CalibrationPlan.from_args(
+        args,
+        dac_settings=range(args.dac_range[0], args.dac_range[1], args.dac_range[2]),
+        interfaces=[args.interface],
+        channels=interface_ranges.get(args.interface, range(0)),
+        bit_order='legacy',
+        sampling=(args.sampling == 'True'),
+        cal_pulse=(args.cal_pulse == 'True'))
+    run_calibration(plan, [CalibTextSink(), ConsoleSink()])
 
 if __name__ == "__main__":
     main()
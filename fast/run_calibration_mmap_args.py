@@ -1,10 +1,6 @@
-import sys
-import os
-import time
 import argparse
-from commands.sampling_functions import *
-from commands.helper_functions import *
-from commands.serial_interface import send_serial_command
+from commands.calibration import *
+from commands.serial_interface import SerialTiming
 
 def parse_args():
     parser = argparse.ArgumentParser(description="QPix FPGA Calibration Script (mmap optimized)")
@@ -16,6 +12,9 @@ def parse_args():
     # Integer/Float Inputs
     parser.add_argument('--trials_num', type=int, default=1, help="Number of trials")
     parser.add_argument('--interface', type=int, default=1, help="Serial interface ID")
+    parser.add_argument('--dual_interface', action='store_true',
+                        help="Program every DAC setting into both serial interfaces and record all 16 "
+                             "channels in one pass (overrides --interface)")
     parser.add_argument('--delta_t', type=int, default=0, help="Delta T select")
     parser.add_argument('--win_width', type=float, default=100e-6, help="Window width in seconds")
     parser.add_argument('--win_wait', type=float, default=5e-6, help="Window wait in seconds")
@@ -36,82 +35,57 @@ def parse_args():
     parser.set_defaults(sampling=True)
     parser.add_argument('--cal_pulse', action='store_true', dest='cal_pulse', help="Enable calibration pulse")
     parser.set_defaults(cal_pulse=False)
+    parser.add_argument('--parallel_drain', action='store_true',
+                        help="Pop all non-empty channel FIFOs with one strobe per round")
+    parser.add_argument('--binary_output', type=str, default=None,
+                        help="Also store every trial's timestamps in this binary file")
+    parser.add_argument('--binary_codec', choices=['raw', 'delta-varint', 'delta-zlib'], default='raw',
+                        help="Timestamp encoding for --binary_output (default: raw)")
+    parser.add_argument('--serial_clock_hz', type=float, default=None,
+                        help="Program the serial interface with hold times derived from this gated "
+                             "clock frequency instead of the fixed 0.5 s sleeps (default: QPIX_SERIAL_CLOCK_HZ, if set)")
+    parser.add_argument('--profile', type=str, default=None,
+                        help="Time every trial phase and write the records to this JSON file")
+
+    # Adaptive trial counts: stop a DAC point once every working channel's mean is known well enough
+    parser.add_argument('--precision', type=float, default=None,
+                        help="Adaptive mode: sample each DAC setting until the 95%% confidence half-width "
+                             "of every working channel's mean count is within this many counts")
+    parser.add_argument('--rel_precision', type=float, default=None,
+                        help="Adaptive mode: as --precision, but as a fraction of each channel's mean")
+    parser.add_argument('--max_trials', type=int, default=10,
+                        help="Trial budget per DAC setting in adaptive mode (default: 10)")
+
+    # Checkpointing: every trial is journaled, --resume skips the settings already done
+    parser.add_argument('--journal', type=str, default='outputs/calib_journal.jsonl',
+                        help="Run journal file (default: outputs/calib_journal.jsonl)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted run from --journal: completed DAC settings are not "
+                             "sampled again and the channel outputs are rebuilt from the journal")
+    parser.add_argument('--new_run', action='store_true',
+                        help="Start over even if --journal holds an unfinished run (it is overwritten)")
 
     return parser.parse_args()
 
-def make_hex_command_fast(DAC_val, base_config):
-    """Replaces make_five and string slicing with efficient formatting."""
-    dac_bits = f"{DAC_val & 0x1F:05b}"
-    replCur0 = dac_bits[0]
-    replCur1_4 = dac_bits[1:][::-1]
-    final_bin = replCur1_4 + base_config[4:24] + replCur0 + base_config[25:]
-    return int(final_bin, 2)
-
 def main():
     args = parse_args()
-    
-    # Generate the range object from arguments
-    DAC_settings = range(args.dac_range[0], args.dac_range[1], args.dac_range[2])
-
-    # --- PRE-LOOP OPTIMIZATIONS ---
-    default_config_bin = read_config_file(args.config_file)
-    working_channels = get_channels_in_use()
-
-    # Clean and open output files
-    out_files = {}
-    for c in range(7):
-        fname = f'outputs/ch{c}_calib.txt'
-        if os.path.exists(fname):
-            os.remove(fname)
-        out_files[c] = open(fname, 'a')
-
-    try:
-        set_ext_clock(1 if args.external_clock else 0)
-        set_sample_select(1)
-        set_delta_t(args.delta_t)
-
-        print(f"Running Calibration on interface {args.interface}...")
-        
-        with open('deltaT_log.txt', 'a') as delta_log:
-            for i, DAC_setting in enumerate(DAC_settings, 1):
-                
-                cmd_int = make_hex_command_fast(DAC_setting, default_config_bin)
-                print(f'*** DAC setting: {DAC_setting}, ({i} out of {len(DAC_settings)}) ***')
-
-                # CALL DIRECTLY: No new Python process spawned
-                send_serial_command(args.interface, cmd_int)
-
-                delta_log.write(f"\n-- DAC setting: {DAC_setting} ---\n")
-
-                # Sampling logic using arguments
-                all_counts, all_timestamps = sample_n_trials(
-                    args.trials_num, 
-                    win_width=args.win_width, 
-                    win_wait=args.win_wait,
-                    reset_width=args.reset_width, 
-                    rst_cal_gap=args.rst_cal_gap,
-                    external_clock=args.external_clock, 
-                    sampling=args.sampling,
-                    cal_pulse=args.cal_pulse, 
-                    file_writer=delta_log
-                )
-
-                # Output Processing
-                for c in range(7):
-                    counts = [trial[c] for trial in all_counts]
-                    mean_val = sum(counts)/len(counts) if counts else 0
-
-                    f = out_files[c]
-                    f.write(f'DAC setting: {DAC_setting}\nCounts: {counts}\nMean: {mean_val:.2f}\n')
-
-                    if c in working_channels:
-                        print(f'Channel {c} counts: {counts}, Mean: {mean_val:.2f}')
-                print("#"*10 + "\n")
 
-    finally:
-        for f in out_files.values():
-            f.close()
-        print("Calibration complete. Files closed.")
+    serial_timing = SerialTiming.from_clock(args.serial_clock_hz) if args.serial_clock_hz else None
+    plan = CalibrationPlan.from_args(
+        args,
+        dac_settings=range(args.dac_range[0], args.dac_range[1], args.dac_range[2]),
+        # One pass over both interfaces covers the whole chip
+        interfaces=[1, 2] if args.dual_interface else [args.interface],
+        channels=range(16) if args.dual_interface else range(7),
+        bit_order='mmap_args',
+        serial_timing=serial_timing)
+
+    sinks = [CalibTextSink(), ConsoleSink()]
+    if args.binary_output:
+        sinks.append(BinarySink(args.binary_output, args.binary_codec, {'script': 'run_calibration_mmap_args.py'},
+                                keep_existing=args.resume))
+    run_calibration(plan, sinks, profile=args.profile, journal=args.journal, resume=args.resume,
+                    new_run=args.new_run)
 
 if __name__ == "__main__":
     main()
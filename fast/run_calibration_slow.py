@@ -0,0 +1,29 @@
+### CALIBRATION SCRIPT ########################################
+# Usage: python3 run_calibration_slow.py
+# Notes: the settings of slow/run_calibration.py (channels 8-15,
+#        calibration pulse on) on the in-process calibration engine
+###############################################################
+
+from commands.calibration import *
+
+### USER INPUTS ###
+DAC_settings = range(31 , 9 , -1) 
+#DAC_settings = [28]
+trials_num  = 4
+interface = 2
+delta_t = 1
+win_width = 100e-6
+win_wait = 5e-6
+reset_width = 5e-6
+rst_cal_gap = 100e-9
+config_file = 'configs/calibration.cfg'
+external_clock = True
+###################
+
+# same DAC bit mapping as slow/: bit 0 -> replenCur0, bits 1-4 -> replCur1-4
+plan = CalibrationPlan(DAC_settings, trials_num, interfaces=[interface], channels=range(15, 7, -1),
+                       bit_order='legacy', config_file=config_file, win_width=win_width,
+                       win_wait=win_wait, reset_width=reset_width, rst_cal_gap=rst_cal_gap,
+                       external_clock=external_clock, sample_select=0, delta_t=delta_t,
+                       sampling=True, cal_pulse=True)
+run_calibration(plan, [CalibTextSink(), ConsoleSink()])
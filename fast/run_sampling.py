@@ -10,6 +10,9 @@ import time
 import datetime
 from commands.helper_functions import *
 from commands.sampling_functions import *
+from commands.acquisition_pipeline import *
+from commands.timestamp_file import TimestampFileWriter
+from commands.trial_timing import TrialProfiler
 
 ### USER-DEFINED VALUES ###
 win_width = 100e-6 #was 100e-3
@@ -20,7 +23,12 @@ trials_num = 1
 interface = 1
 external_clock = True
 output_file = 'outputs/DAC_sweep_alex.txt'
+pipelined = False # format/write each trial while the next one is drained
 overwrite_old_file = True
+parallel_drain = False # pop all channels with one strobe per round
+binary_output_file = None # e.g. 'outputs/DAC_sweep_alex.qpxt' for a binary copy of the timestamps
+binary_codec = 'raw' # 'raw', 'delta-varint' or 'delta-zlib'
+profile_file = None # e.g. 'outputs/trial_timing.json' for per-phase trial timings
 ###########################
 
 if external_clock: set_ext_clock(1)
@@ -29,7 +37,28 @@ else: set_ext_clock(0)
 set_sample_select(1) #ignores delta t
 
 print(f'Sampling working channels with win width: {win_width}, win_wait: {10e-6}, reset_width: {reset_width}, number of trials: {trials_num}')
-all_counts, all_timestamps = sample_n_trials(trials_num, win_width=win_width, win_wait=win_wait, reset_width=reset_width, rst_cal_gap = rst_cal_gap, external_clock=external_clock, sampling=True)
+writer = SamplingTextWriter(get_channels_in_use(), output_file)
+binary_writer = None
+if binary_output_file:
+    binary_writer = TimestampFileWriter(binary_output_file, {
+        'script': 'run_sampling.py', 'date': str(datetime.datetime.now()),
+        'win_width': win_width, 'win_wait': win_wait, 'reset_width': reset_width,
+        'rst_cal_gap': rst_cal_gap, 'trials_num': trials_num, 'interface': interface,
+        'external_clock': external_clock, 'channels': get_channels_in_use()},
+        codec=binary_codec)
+profiler = TrialProfiler() if profile_file else None
+
+def consume(trial, counts, timestamps):
+    writer(trial, counts, timestamps)
+    if binary_writer: binary_writer(trial, counts, timestamps)
+
+if pipelined:
+    run_pipelined(consume, trials_num, win_width=win_width, win_wait=win_wait, reset_width=reset_width, rst_cal_gap = rst_cal_gap, external_clock=external_clock, sampling=True, parallel_drain=parallel_drain, profiler=profiler)
+else:
+    for trial in iter_trials(trials_num, win_width=win_width, win_wait=win_wait, reset_width=reset_width, rst_cal_gap = rst_cal_gap, external_clock=external_clock, sampling=True, parallel_drain=parallel_drain, profiler=profiler):
+        consume(*trial)
+if binary_writer: binary_writer.close()
+if profiler: profiler.write_json(profile_file)
 
 # record values in a running document that separates sampling by date + time
 if overwrite_old_file:
@@ -37,26 +66,7 @@ if overwrite_old_file:
         os.remove(output_file)
         print("\nOverwriting existing output file.")
 else: print("\nAppending to existing output file.")
-with open(output_file, 'a') as f:
-    f.write(f'Sampling results below finished at: {datetime.datetime.now()}\n')
-    f.write(f'Window Width : {win_width}\n')
-    print('\nRESULTS:')
-    for c in range(16):
-        if c not in get_channels_in_use(): continue
-        f.write(f'Channel {c} results\n')
-        print(f'Channel {c} results')
-        f.write(f'Counts: {[counts[c] for counts in all_counts]}\n')
-        print(f'Counts: {[counts[c] for counts in all_counts]}')
-        counts = [counts[c] for counts in all_counts]
-        print(f'Avg Count: {sum(counts) / len(counts)}')
-        f.write(f'Avg Count: {sum(counts) / len(counts)}\n')
-        for trial in range(trials_num):
-            f.write(f'Trial {trial} timestamps: {all_timestamps[trial][c]}\n')
-        #    print(f'Trial {trial} timestamps: {all_timestamps[trial][c]}')
-        f.write('\n')
-        print()
-    f.write('******************************************************\n')
-    f.close()
+writer.append_to(output_file, win_width)
 
 
 
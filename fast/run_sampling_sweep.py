@@ -10,6 +10,8 @@ import time
 import datetime
 from commands.helper_functions import *
 from commands.sampling_functions import *
+from commands.acquisition_pipeline import *
+from commands.timestamp_file import TimestampFileWriter
 
 ### USER-DEFINED VALUES ###
 win_width_values = [500e-6, 1e-3,100e-3, 1, 2, 4, 8, 10, 20, 40]  # List of window widths to test
@@ -21,7 +23,10 @@ trials_num = 10
 interface = 2
 external_clock = True
 output_file = 'outputs/sampling_resultsb4-717_chan15.txt'
+pipelined = False # format/write each trial while the next one is drained
 overwrite_old_file = False
+binary_output_file = None # e.g. 'outputs/sampling_sweep_{win_width}.qpxt', one file per window width
+binary_codec = 'delta-varint' # 'raw', 'delta-varint' or 'delta-zlib'
 ###########################
 
 if external_clock: set_ext_clock(1)
@@ -31,7 +36,26 @@ set_sample_select(1) #ignores delta t
 
 for win_width in win_width_values:
     print(f'Sampling working channels with win width: {win_width}, win_wait: {win_wait}, reset_width: {reset_width}, number of trials: {trials_num}')
-    all_counts, all_timestamps = sample_n_trials(trials_num, win_width=win_width, win_wait=win_wait, reset_width=reset_width, rst_cal_gap=rst_cal_gap, external_clock=external_clock, sampling=True)
+    writer = SamplingTextWriter(get_channels_in_use(), output_file)
+    binary_writer = None
+    if binary_output_file:
+        binary_writer = TimestampFileWriter(binary_output_file.format(win_width=win_width), {
+            'script': 'run_sampling_sweep.py', 'date': str(datetime.datetime.now()),
+            'win_width': win_width, 'win_wait': win_wait, 'reset_width': reset_width,
+            'rst_cal_gap': rst_cal_gap, 'trials_num': trials_num, 'interface': interface,
+            'external_clock': external_clock, 'channels': get_channels_in_use()},
+            codec=binary_codec)
+
+    def consume(trial, counts, timestamps):
+        writer(trial, counts, timestamps)
+        if binary_writer: binary_writer(trial, counts, timestamps)
+
+    if pipelined:
+        run_pipelined(consume, trials_num, win_width=win_width, win_wait=win_wait, reset_width=reset_width, rst_cal_gap=rst_cal_gap, external_clock=external_clock, sampling=True)
+    else:
+        for trial in iter_trials(trials_num, win_width=win_width, win_wait=win_wait, reset_width=reset_width, rst_cal_gap=rst_cal_gap, external_clock=external_clock, sampling=True):
+            consume(*trial)
+    if binary_writer: binary_writer.close()
 
 
     # record values in a running document that separates sampling by date + time
@@ -42,23 +66,4 @@ for win_width in win_width_values:
     else:
         print("\nAppending to existing output file.")
    
-    with open(output_file, 'a') as f:
-        f.write(f'Sampling results below finished at: {datetime.datetime.now()}\n')
-        f.write(f'Window Width : {win_width}\n')
-        print('\nRESULTS:')
-        for c in range(16):
-            if c not in get_channels_in_use(): continue
-            f.write(f'Channel {c} results\n')
-            print(f'Channel {c} results')
-            f.write(f'Counts: {[counts[c] for counts in all_counts]}\n')
-            print(f'Counts: {[counts[c] for counts in all_counts]}')
-            counts = [counts[c] for counts in all_counts]
-            print(f'Avg Count: {sum(counts) / len(counts)}')
-            f.write(f'Avg Count: {sum(counts) / len(counts)}\n')
-            for trial in range(trials_num):
-                f.write(f'Trial {trial} timestamps: {all_timestamps[trial][c]}\n')
-            #    print(f'Trial {trial} timestamps: {all_timestamps[trial][c]}')
-            f.write('\n')
-            print()
-        f.write('******************************************************\n')
-    f.close()
+    writer.append_to(output_file, win_width)
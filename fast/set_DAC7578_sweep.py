@@ -1,76 +1,29 @@
-import sys
-import os
-import math
-import subprocess
 import time
+from commands.acquisition_pipeline import CountSampler
+from commands.i2c_dacs import dac7578_counts, set_dac7578_channels
 
 vref = 1.007
-dac_addr = "0x48"
+dac_addr = 0x48
 step_size = 0.0001  # Increment step for v_set
 start_vset = 0.7765  # Starting value for v_set
 max_vset = vref  # Maximum value for v_set
 max_iterations = 2000  # Maximum number of sweeps per channel
 zero_count_threshold = 1  # Stop sweeping if reset counts are zero for this many iterations
 
-# External script to measure reset counts
-run_sampling = "run_sampling.py"
-
-def run_sampling_and_parse():
-    """
-    Run the external script and parse the output file to get reset counts for all channels.
-    Returns a dictionary with channel numbers as keys and average counts as values.
-    """
-    try:
-        # Run the external script
-        subprocess.run(["python3", run_sampling], check=True)
-
-        # Path to the output file generated by run_sampling.py
-        output_file = 'outputs/DAC_sweep_alex.txt'
-
-        # Parse the output file
-        reset_counts = {}
-        with open(output_file, 'r') as f:
-            lines = f.readlines()
-
-        # Extract reset counts for all channels
-        for i, line in enumerate(lines):
-            if line.strip().startswith('Channel'):
-                # Extract the channel number
-                channel = int(line.split()[1]) - 8
-                # Extract the Avg Count from the next line
-                avg_count_line = lines[i + 2]
-                avg_count = float(avg_count_line.split(':')[1].strip())
-                reset_counts[channel] = avg_count
-
-        return reset_counts
-
-    except Exception as e:
-        print(f"Error running sampling or parsing output file: {e}")
-        return None
+# Sampling at every v_set point, in-process (run_sampling.py settings)
+trials_num = 1  # Sampling trials averaged per point
+precision = None  # e.g. 1.0: adaptive, sample a point until every channel's 95% CI is within ± this many counts
+max_trials = 10  # Trial budget per point in adaptive mode
+output_file = None  # e.g. 'outputs/DAC_sweep_alex.txt' to keep the run_sampling.py text output
 
 def set_dac_all_channels(vset, frozen_channels):
     """
     Set the DAC value for all unfrozen channels to the given v_set.
     """
-    steps = vref / 4096
-    if vset <= 0:
-        counts = 0x000
-    elif vset >= vref:
-        counts = 0xfff
-    else:
-        counts = math.floor(vset / steps)
-
-    # Format counts for DAC
-    counts_formatted = str.format('{:04X}', counts << 4)
-    msn = counts_formatted[0:2]
-    lsn = counts_formatted[2:4]
-
-    # Send command for all unfrozen channels
-    for channel in range(8):  # Channels 0-7
-        if channel not in frozen_channels:
-            command = f'i2cset -y 1 {dac_addr} 0x0{channel} 0x{msn} 0x{lsn} i'
-            print(f"Sending command for channel {channel + 8}: {command} {vset}")
-            os.system(command)
+    counts = dac7578_counts(vset, vref)
+    channels = [channel for channel in range(8) if channel not in frozen_channels]  # Channels 0-7
+    print(f"Setting channels {[channel + 8 for channel in channels]} to 0x{counts:03X} {vset}")
+    set_dac7578_channels(counts, channels, dac_addr)
 
 def sweep_all_channels():
     """
@@ -83,6 +36,8 @@ def sweep_all_channels():
     zero_count_tracker = {channel: 0 for channel in range(8)}  # Track consecutive zero counts per channel
     tolerance = 2
 
+    measure_reset_counts = CountSampler(trials_num, output_file, precision=precision, max_trials=max_trials)
+
     print("Sweeping channels")
 
     while vset <= max_vset and len(frozen_channels) < 7:
@@ -90,11 +45,8 @@ def sweep_all_channels():
         set_dac_all_channels(vset, frozen_channels)
         time.sleep(0.1)  # Allow time for the DAC to stabilize
 
-        # Run sampling and parse the results
-        reset_counts = run_sampling_and_parse()
-        if reset_counts is None:
-            print("Failed to retrieve reset counts. Exiting.")
-            sys.exit(1)
+        # Sample all channels and average the counts
+        reset_counts = measure_reset_counts()
 
         # Check reset counts for all channels
         for channel, reset_count in reset_counts.items():
@@ -0,0 +1,89 @@
+### TEXT OUTPUT PARSER TESTS #####################
+# Usage: python3 -m pytest tests (from fast/)
+#################################################
+
+import ast
+import random
+import pytest
+from commands import text_outputs
+from commands.text_outputs import iter_calib_points, iter_sampling_results, iter_sampling_trials
+
+CHUNK_SIZES = [1, 3, 7, 64, text_outputs.CHUNK_SIZE]
+
+def _list(line):
+    return ast.literal_eval(line.split(':', 1)[1].strip())
+
+@pytest.fixture
+def sampling_file(tmp_path):
+    rng = random.Random(1)
+    lines = []
+    for block in range(2):
+        lines.append(f'Sampling results below finished at: 2024-02-13 10:0{block}:00.000000')
+        lines.append('Window Width : 0.0001')
+        for c in (3, 12):
+            trials = [sorted(rng.randrange(2**64) for _ in range(rng.randrange(6))) for _ in range(4)]
+            trials[1] = [0, 2**64 - 1]
+            counts = [len(t) for t in trials]
+            lines.append(f'Channel {c} results')
+            lines.append(f'Counts: {counts}')
+            lines.append(f'Avg Count: {sum(counts) / len(counts)}')
+            lines.extend(f'Trial {t} timestamps: {ts}' for t, ts in enumerate(trials))
+            lines.append('')
+        lines.append('******************************************************')
+    path = tmp_path / 'sampling.txt'
+    path.write_text('\n'.join(lines) + '\n')
+    return path, lines
+
+@pytest.fixture
+def calib_file(tmp_path):
+    lines = []
+    for dac in range(12, 16):
+        counts = [dac * 1000 + t for t in range(dac - 11)]
+        lines += [f'DAC setting: {dac}', f'Counts: {counts}', f'Mean: {sum(counts)/len(counts):.2f}']
+    path = tmp_path / 'ch3_calib.txt'
+    path.write_text('\n'.join(lines) + '\n')
+    return path, lines
+
+def _expected_sampling(lines):
+    """(block, channel, trial, timestamps) and (block, channel, counts), via ast.literal_eval."""
+    trials, results, block, channel = [], [], -1, None
+    for line in lines:
+        if line.startswith('Sampling results'):
+            block += 1
+        elif line.startswith('Channel '):
+            channel = int(line.split()[1])
+        elif line.startswith('Counts:'):
+            results.append((block, channel, _list(line)))
+        elif line.startswith('Trial '):
+            trials.append((block, channel, int(line.split()[1]), _list(line)))
+    return trials, results
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_sampling_trials(sampling_file, chunk_size):
+    path, lines = sampling_file
+    expected, _ = _expected_sampling(lines)
+    parsed = [(b, c, t, [int(x) for x in ts]) for b, c, t, ts in iter_sampling_trials(path, chunk_size)]
+    assert parsed == expected
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_sampling_results(sampling_file, chunk_size):
+    path, lines = sampling_file
+    expected_trials, expected = _expected_sampling(lines)
+    results = list(iter_sampling_results(path, timestamps=True, chunk_size=chunk_size))
+    assert [(r.block, r.channel, [int(x) for x in r.counts]) for r in results] == expected
+    assert [[int(x) for x in ts] for r in results for ts in r.timestamps] == [e[3] for e in expected_trials]
+    assert all(r.win_width == 0.0001 for r in results)
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_calib_points(calib_file, chunk_size):
+    path, lines = calib_file
+    expected = [(int(lines[i].split(':')[1]), _list(lines[i + 1])) for i in range(0, len(lines), 3)]
+    parsed = [(dac, [int(x) for x in counts]) for dac, counts in iter_calib_points(path, chunk_size)]
+    assert parsed == expected
+
+def test_without_numpy(sampling_file, monkeypatch):
+    monkeypatch.setattr(text_outputs, 'np', None)
+    path, lines = sampling_file
+    expected, _ = _expected_sampling(lines)
+    parsed = [(b, c, t, list(ts)) for b, c, t, ts in iter_sampling_trials(path, 5)]
+    assert parsed == expected
@@ -0,0 +1,75 @@
+### TIMESTAMP FILE TESTS #########################
+# Usage: python3 -m pytest tests (from fast/)
+#################################################
+
+import pytest
+from commands import timestamp_file
+from commands.timestamp_file import (TimestampFile, TimestampFileWriter, CHANNELS, MASK64,
+                                     encode_delta_varint, decode_delta_varint,
+                                     encode_delta_zlib, decode_delta_zlib)
+
+VALUES = [
+    [],
+    [0],
+    [MASK64],
+    [0, MASK64, 0, 1, MASK64 - 1, 1 << 63, (1 << 63) - 1],
+    list(range(1000, 5000, 37)),
+    [5000, 10, 2**40, 3],
+]
+
+@pytest.fixture(params=[True, False], ids=['numpy', 'python'])
+def use_numpy(request, monkeypatch):
+    if request.param:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(timestamp_file, 'np', None)
+    return request.param
+
+def _trials():
+    return [[VALUES[(t + c) % len(VALUES)] for c in range(CHANNELS)] for t in range(len(VALUES))]
+
+@pytest.mark.parametrize('values', VALUES)
+def test_delta_varint(values, use_numpy):
+    blob = encode_delta_varint(values) if values else b''
+    assert [int(x) for x in decode_delta_varint(blob, len(values))] == values
+
+@pytest.mark.parametrize('values', VALUES)
+def test_delta_zlib(values, use_numpy):
+    blob = encode_delta_zlib(values)
+    assert [int(x) for x in decode_delta_zlib(blob, len(values))] == values
+
+@pytest.mark.parametrize('codec', ['raw', 'delta-varint', 'delta-zlib'])
+def test_file_round_trip(tmp_path, codec, use_numpy):
+    path = tmp_path / 'run.qpxt'
+    trials = _trials()
+    with TimestampFileWriter(str(path), {'run': 1}, codec=codec) as writer:
+        for ts in trials:
+            writer.add_trial(ts)
+    with TimestampFile(str(path)) as f:
+        assert f.metadata == {'run': 1}
+        assert not f.recovered
+        assert f.counts() == [[len(ts) for ts in trial] for trial in trials]
+        for t, trial in enumerate(trials):
+            for c in range(CHANNELS):
+                assert [int(x) for x in f.timestamps(t, c)] == trial[c]
+
+@pytest.mark.parametrize('codec', ['raw', 'delta-varint'])
+def test_unclosed_file_is_recovered(tmp_path, codec, use_numpy):
+    path = tmp_path / 'run.qpxt'
+    trials = _trials()
+    writer = TimestampFileWriter(str(path), codec=codec)
+    for ts in trials:
+        writer.add_trial(ts)
+    writer.flush()
+    # a torn last trial, as left by a crash mid-write
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:-3])
+    writer._f.close()
+    with TimestampFile(str(path)) as f:
+        assert f.recovered
+        assert len(f) == len(trials) - 1
+        for t in range(len(f)):
+            for c in range(CHANNELS):
+                assert [int(x) for x in f.timestamps(t, c)] == trials[t][c]